@@ -17,6 +17,8 @@
 
 __version__ = '0.1.0'
 
+import atexit
+import collections
 import inspect
 import math
 import operator as op
@@ -28,25 +30,138 @@ import time
 
 import kurt
 
+import skip.layers
+import skip.optimize
+import skip.reactive
+import skip.snapshot
+import skip.vm
+from skip.snapshot import Snapshot
+
 
 
 #-- Util --#
 
+KEY_NAMES = frozenset(kurt.Insert(None, "key").options())
+"""The keys which "when key pressed" and "key pressed?" can use."""
+
 def str_is_number(value):
+    return parse_number(value) is not None
+
+NUMBER_CACHE_SIZE = 10000
+number_cache = {}
+
+def parse_number(value):
+    """Return a string as an int or float, or None if it isn't a number.
+
+    Strings read from variables, lists and "answer" tend to be used as
+    numbers over and over, so the result is cached by string. Variables and
+    lists get new strings when they're written to, so it never goes stale.
+
+    """
     try:
-        value = float(value)
-        if value == int(value):
-            value = int(value)
+        return number_cache[value]
+    except KeyError:
+        pass
+    except TypeError: # unhashable
+        return None
+    try:
+        number = float(value)
     except (TypeError, ValueError):
-        return False
+        number = None
     else:
-        return True
+        if number.is_integer():
+            number = int(number)
+    if len(number_cache) >= NUMBER_CACHE_SIZE:
+        number_cache.clear()
+    number_cache[value] = number
+    return number
+
+def hat_commands(script):
+    """Return the commands of a script's hat block, or nothing if it doesn't
+    start with one.
+
+    """
+    if not script.blocks or script.blocks[0].type.shape != "hat":
+        return []
+    commands = []
+    for pbt in script.blocks[0].type._plugins.values():
+        if pbt.command not in commands:
+            commands.append(pbt.command)
+    return commands
+
+
+
+#-- Runtime state --#
+
+class GraphicEffects(object):
+    """The graphic effects of a scriptable. Behaves like a dict of effect
+    name to value, without the size of one.
+
+    """
+    __slots__ = ('brightness', 'color', 'fisheye', 'ghost', 'mosaic',
+                 'pixelate', 'whirl')
+
+    def __init__(self):
+        self.clear()
+
+    def __repr__(self):
+        return "<GraphicEffects(%r)>" % dict(self.items())
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        setattr(self, name, value)
+
+    def get(self, name, default=None):
+        return getattr(self, name) if name in self.__slots__ else default
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def items(self):
+        """Return ``(name, value)`` pairs, sorted by name."""
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def update(self, values):
+        for (name, value) in values.items():
+            self[name] = value
+
+    def clear(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+
+class Pen(object):
+    __slots__ = ('is_down', 'size', 'color', 'hue', 'shade')
+
+    DEFAULT_COLOR = kurt.Color("#00f")
+
+    def __init__(self):
+        self.is_down = False
+        self.size = 1
+        self.color = self.DEFAULT_COLOR
+        self.hue = 0   # TODO ?
+        self.shade = 0 # TODO ?
+
+    def __repr__(self):
+        return "<Pen(%s, %r)>" % ("down" if self.is_down else "up",
+                                  self.color)
 
 
 
 #-- Interpreter --#
 
 class Thread(object):
+    __slots__ = ('generator', 'scriptable', 'callback')
+
     def __init__(self, generator, scriptable, callback):
         self.generator = generator
         self.scriptable = scriptable
@@ -57,26 +172,85 @@ class Thread(object):
             event = self.generator.next()
             while event:
                 assert isinstance(event, ScriptEvent)
+                if event is END_FRAME:
+                    return
                 yield event
                 event = self.generator.next()
         except StopIteration:
-            yield ScriptEvent(self.scriptable, "stop")
+            yield STOP
 
     def finish(self):
         if self.callback:
             self.callback(self)
 
+    def get_state(self):
+        """Generators can't be saved, so the thread restarts on restore."""
+        return None
+
+    def set_state(self, state):
+        pass
+
 
 class Interpreter(object):
     COMMANDS = {}
 
-    def __init__(self, project):
+    KINDS = {}
+    """What the value of reporter blocks depends on, by BlockType.
+
+    See :mod:`skip.reactive`.
+
+    """
+
+    ENGINES = ("generator", "vm")
+
+    REPORTER_BUDGET = 0.005
+    """Most seconds a :meth:`push_reporter` thread runs for each frame."""
+
+    def __init__(self, project, engine="generator"):
+        """Interpreter for a project.
+
+        :param engine: how scripts are run: "generator" runs them as nested
+                       generators, "vm" compiles them to instructions for
+                       :mod:`skip.vm`.
+
+        """
+        if engine not in self.ENGINES:
+            raise ValueError("unknown engine %r" % engine)
+        self.engine = engine
+        self.code = {}
+        self.prepared = {}
+        self.hats = {}
+        self.fold_stats = skip.optimize.FoldStats()
+        self.conditions = {}
+        self.epoch = time.time()
+        self.frame = 0
+
+        self.frame_time = None
+        """If set, returned by :meth:`now` -- so timing is the same throughout
+        a frame, eg. when recording input."""
+
+        self.timestep = None
+        """Seconds the clock advances each tick. None to follow the wall
+        clock. See :meth:`set_timestep`."""
+        self.step_clock = 0
+
+        self.keep_render_state = False
+        """Set :attr:`render_state` at the end of each tick."""
+        self.render_state = None
+
+        self.running_thread = None
+        """``(script, thread)`` while a thread is being run. Read by
+        :class:`skip.profiler.Profiler`."""
+
         self.project = project
         project.interpreter = self
         for scriptable in [self.project.stage] + self.project.sprites:
             self.augment(scriptable)
+        self.bounds_cache = {}
+        self.reset_layers()
+        self.index_hats()
         self.stop()
-        reset_timer(self)
+        self.timer_start = 0
 
         self.drag_sprite = None
         self.drag_offset = (0, 0)
@@ -87,23 +261,85 @@ class Interpreter(object):
         return self
 
     def augment(self, scriptable):
-        scriptable.graphic_effects = {
-            'brightness': 0,
-            'color': 0,
-            'fisheye': 0,
-            'ghost': 0,
-            'mosaic': 0,
-            'pixelate': 0,
-            'whirl': 0,
-        }
+        scriptable.graphic_effects = GraphicEffects()
         scriptable.instrument = 1
 
         if isinstance(scriptable, kurt.Sprite):
-            scriptable.is_pen_down = False
-            scriptable.pen_size = 1
-            scriptable.pen_color = kurt.Color("#00f")
-            scriptable.pen_hue = 0   # TODO ?
-            scriptable.pen_shade = 0 # TODO ?
+            scriptable.pen = Pen()
+
+    # Layers
+
+    def reset_layers(self, sprites=None):
+        """Rebuild :attr:`layers`, from the order of ``project.actors`` by
+        default.
+
+        """
+        if sprites is None:
+            sprites = [a for a in self.project.actors
+                       if isinstance(a, kurt.Sprite)]
+        self.layers = skip.layers.Layers(sprites)
+        self.sprites_by_name = dict((sprite.name, sprite)
+                                    for sprite in self.project.sprites)
+
+    def sync_layers(self):
+        """Write the order of :attr:`layers` back to ``project.actors``, eg.
+        before saving.
+
+        """
+        sprites = iter(self.layers)
+        actors = self.project.actors
+        actors[:] = [sprites.next() if isinstance(a, kurt.Sprite) else a
+                     for a in actors if not isinstance(a, kurt.Sprite)
+                                        or a in self.layers]
+
+    # Collisions
+
+    def get_bounds(self, sprite):
+        """Return :func:`bounds` of a sprite, cached until it moves, turns,
+        resizes or changes costume.
+
+        """
+        key = (sprite.costume, sprite.position, sprite.direction, sprite.size)
+        cached = self.bounds_cache.get(sprite)
+        if cached and cached[0] == key:
+            return cached[1]
+        rect = bounds(sprite)
+        self.bounds_cache[sprite] = (key, rect)
+        return rect
+
+    def touching_sprites(self, s, sprites):
+        """Return which of the sprites s is touching.
+
+        Boxes are checked first; the screen then tests the ones that
+        overlap, working out the mask of s only once.
+
+        """
+        rect = self.get_bounds(s)
+        candidates = [other for other in sprites
+                      if rect.collide_rect(self.get_bounds(other))]
+        if not candidates:
+            return []
+        return self.screen.touching_sprites(s, candidates)
+
+    def nearest_sprite(self, s, sprites):
+        """Return the sprite closest to s, or None."""
+        (x, y) = s.position
+        nearest = None
+        for other in sprites:
+            (ox, oy) = other.position
+            distance = (ox - x) ** 2 + (oy - y) ** 2
+            if nearest is None or distance < nearest[0]:
+                nearest = (distance, other)
+        return nearest[1] if nearest else None
+
+    def sprites_in(self, names):
+        """Return the sprites named in a list, ignoring other items."""
+        sprites = []
+        for name in names:
+            sprite = self.sprites_by_name.get(unicode(name))
+            if sprite and sprite not in sprites:
+                sprites.append(sprite)
+        return sprites
 
     # Threads
 
@@ -114,35 +350,136 @@ class Interpreter(object):
 
     def trigger_hats(self, command, arg=None, callback=None):
         """Returns a list with each script that is triggered."""
-        threads = []
-        for scriptable in [self.project.stage] + self.project.sprites:
-            threads += self.trigger_scriptable_hats(scriptable, command, arg,
-                                                    callback)
-        return threads
+        return self.trigger_scriptable_hats(None, command, arg, callback)
 
     def trigger_scriptable_hats(self, scriptable, command, arg=None,
                                 callback=None):
+        """Start the scripts with a hat block with the given command, for one
+        scriptable or all of them if scriptable is None.
+
+        """
         threads = []
-        for script in scriptable.scripts:
-            hat = script.blocks[0]
-            if hat.type.has_command(command):
+        for (s, script) in self.hats.get(command, ()):
+            if scriptable is None or s is scriptable:
+                hat = script.blocks[0]
                 if arg is None or (hat.args and hat.args[0] == arg):
-                    thread = self.push_script(scriptable, script, callback)
+                    thread = self.push_script(s, script, callback)
                     threads.append(thread)
         return threads
 
-    def push_script(self, scriptable, script, callback=None):
-        """Run the script and add it to the list of threads."""
+    def push_script(self, scriptable, script, callback=None, errback=None):
+        """Run the script and add it to the list of threads.
+
+        :param errback: called with ``(thread, exception)`` if the thread
+                        raises one, which stops it. Otherwise the exception
+                        is raised out of :meth:`tick`.
+
+        """
         if script in self.threads:
             self.threads[script].finish()
-        thread = Thread(self.run_script(scriptable, script),
-                                      scriptable, callback)
+        if self.engine == "vm":
+            thread = skip.vm.VMThread(self, self.compile(script), scriptable,
+                                      callback)
+        else:
+            thread = Thread(self.run_script(scriptable, self.prepare(script)),
+                            scriptable, callback)
+        if errback:
+            self.errbacks[thread] = errback
         self.new_threads[script] = thread
         return thread
 
+    def push_reporter(self, scriptable, block, callback, budget=None):
+        """Evaluate a reporter on a thread, and call ``callback(value,
+        error)`` when it's done -- so an expensive one is spread over several
+        frames, rather than holding one up. See :meth:`evaluate_slices`.
+
+        ``error`` is the exception evaluating it raised, if any.
+
+        :raises: :class:`kurt.BlockNotSupported`, before starting the thread
+
+        """
+        self.check(block)
+        if budget is None:
+            budget = self.REPORTER_BUDGET
+        def run():
+            out = []
+            try:
+                for x in self.evaluate_slices(scriptable, block, out, budget):
+                    yield x
+            except Exception, e:
+                callback(None, e)
+            else:
+                callback(out[0], None)
+        thread = Thread(run(), scriptable, None)
+        self.new_threads[kurt.Script([block])] = thread
+        return thread
+
     def add_new_threads(self):
-        self.threads.update(self.new_threads)
-        self.new_threads = {}
+        for (script, thread) in self.new_threads.items():
+            self.threads[script] = thread
+            by_script = self.threads_by_scriptable.setdefault(
+                    thread.scriptable, collections.OrderedDict())
+            by_script[script] = thread
+        self.new_threads = collections.OrderedDict()
+
+    def remove_thread(self, script):
+        thread = self.threads.pop(script)
+        self.errbacks.pop(thread, None)
+        by_script = self.threads_by_scriptable[thread.scriptable]
+        del by_script[script]
+        if not by_script:
+            del self.threads_by_scriptable[thread.scriptable]
+        return thread
+
+    def threads_of(self, scriptable):
+        """Return ``(script, thread)`` for each running thread of a
+        scriptable, in the order they were started.
+
+        """
+        return self.threads_by_scriptable.get(scriptable, {}).items()
+
+    def stop_scriptable(self, scriptable, keep=None):
+        """Stop the running threads of a scriptable, except ``keep``."""
+        by_script = self.threads_by_scriptable.get(scriptable, {})
+        for (script, thread) in by_script.items():
+            if thread is not keep:
+                thread.finish()
+                self.remove_thread(script)
+
+    def pause(self, scriptable):
+        """Stop running a scriptable's threads until :meth:`resume`."""
+        self.paused.add(scriptable)
+
+    def resume(self, scriptable):
+        self.paused.discard(scriptable)
+
+    def now(self):
+        """Seconds since the interpreter started. Used for timing blocks."""
+        if self.frame_time is not None:
+            return self.frame_time
+        return time.time() - self.epoch
+
+    def timing_yield(self):
+        """What timing blocks yield while they wait: :data:`END_FRAME` if
+        the clock only moves between ticks, so they still finish inside "all
+        at once".
+
+        """
+        if self.frame_time is not None:
+            return END_FRAME
+
+    def set_timestep(self, seconds):
+        """Advance the clock by a fixed number of seconds each tick, rather
+        than following the wall clock, so "wait", "glide" and the timer
+        behave the same however long frames take. None to switch back.
+
+        """
+        if seconds is None:
+            self.epoch = time.time() - self.now()
+            self.frame_time = None
+        else:
+            self.step_clock = self.now() if self.frame else 0
+        self.timestep = seconds
 
     def tick(self, events):
         """Execute one frame of the interpreter.
@@ -150,6 +487,10 @@ class Interpreter(object):
         Don't call more than 40 times per second.
 
         """
+        self.frame += 1
+        if self.timestep is not None:
+            self.frame_time = self.step_clock
+            self.step_clock += self.timestep
         self.add_new_threads()
 
         if self.drag_sprite:
@@ -162,12 +503,12 @@ class Interpreter(object):
 
         for event in events:
             if event.kind == "key_pressed":
-                assert event.value in kurt.Insert(None, "key").options()
+                assert event.value in KEY_NAMES
                 self.trigger_hats("whenKeyPressed", event.value)
 
             elif event.kind == "mouse_down":
                 mouse_pos = self.screen.get_mouse_pos()
-                for sprite in reversed(self.project.sprites):
+                for sprite in reversed(self.layers.visible()):
                     rect = bounds(sprite)
                     if rect.collide_point(mouse_pos):
                         if self.screen.touching_mouse(sprite):
@@ -193,45 +534,212 @@ class Interpreter(object):
                                                      "whenClicked")
                     self.drag_sprite = None
 
-        remove_threads = []
-        while 1:
-            for (script, thread) in self.threads.items():
-                modified = False
+        for (script, thread) in self.threads.items():
+            if self.threads.get(script) is not thread:
+                continue # stopped earlier this frame
+            if thread.scriptable in self.paused:
+                continue
+            self.running_thread = (script, thread)
+            try:
                 for event in thread.tick():
                     if event.kind == "stop":
                         if event.value == "all":
+                            self.running_thread = None
                             self.stop()
+                            self.end_frame()
                             return
                         elif event.value == "other scripts in sprite":
-                            for (script, other) in self.threads.items():
-                                if other.scriptable == thread.scriptable:
-                                    other.finish()
-                                    del self.threads[script]
-                            modified = True
-                            break
+                            self.stop_scriptable(thread.scriptable,
+                                                 keep=thread)
                         else:
                             thread.finish()
-                            del self.threads[script]
-                            modified = True
+                            self.remove_thread(script)
                             break
                     else: # Pass to Screen
                         yield event
-                if modified:
-                    break
-            else:
-                break
+            except Exception, e:
+                errback = self.errbacks.get(thread)
+                if not errback:
+                    raise
+                if self.threads.get(script) is thread:
+                    self.remove_thread(script)
+                errback(thread, e)
+            self.running_thread = None
 
         self.add_new_threads()
+        self.end_frame()
+
+    def end_frame(self):
+        if self.keep_render_state:
+            self.render_state = self.take_render_state()
+
+    def take_render_state(self):
+        """Return a :class:`RenderState` of how the project looks now."""
+        stage = self.project.stage
+        actors = [actor_state(stage, 0)]
+        for sprite in self.layers.visible():
+            actors.append(actor_state(sprite, len(actors)))
+        return RenderState(self.frame, tuple(actors))
 
     def stop(self):
         """Stop running threads."""
-        self.threads = {}
-        self.new_threads = {}
+        self.threads = collections.OrderedDict() # run in the order started
+        self.new_threads = collections.OrderedDict()
+        self.threads_by_scriptable = {}
+        self.errbacks = {} # thread: errback
+        self.paused = set()
         self.answer = ""
         self.ask_lock = False
 
+    # Snapshots
+
+    def snapshot(self):
+        """Return a :class:`Snapshot` of the current state."""
+        return skip.snapshot.take(self)
+
+    def restore(self, snapshot):
+        """Resume from a :class:`Snapshot` taken by :attr:`snapshot`."""
+        skip.snapshot.restore(self, snapshot)
+
     # Scripts
 
+    def index_hats(self):
+        """Rebuild :attr:`hats`, the ``(scriptable, script)`` pairs for each
+        hat block command.
+
+        """
+        self.hats = {}
+        for scriptable in [self.project.stage] + self.project.sprites:
+            for script in scriptable.scripts:
+                for command in hat_commands(script):
+                    self.hats.setdefault(command, []).append((scriptable,
+                                                              script))
+
+    def add_script(self, scriptable, script):
+        """Add a script to a scriptable, so its hat can trigger it."""
+        scriptable.scripts.append(script)
+        for command in hat_commands(script):
+            self.hats.setdefault(command, []).append((scriptable, script))
+
+    def replace_script(self, scriptable, index, script):
+        """Replace one of a scriptable's scripts while the project is running.
+
+        :param script: a :class:`kurt.Script`, or text to parse with
+                       :func:`kurt.text.parse`.
+
+        Only the new script is compiled. If the old one was running, it's
+        restarted as the new one; other threads are left alone.
+
+        Returns the new :class:`kurt.Script`.
+
+        """
+        if isinstance(script, basestring):
+            script = kurt.text.parse(script, scriptable)
+        old_script = scriptable.scripts[index]
+        scriptable.scripts[index] = script
+
+        if hat_commands(script) == hat_commands(old_script):
+            for pairs in self.hats.values():
+                for (i, (s, other)) in enumerate(pairs):
+                    if other is old_script:
+                        pairs[i] = (s, script)
+        else:
+            self.index_hats()
+
+        self.code.pop(old_script, None)
+        self.prepared.pop(old_script, None)
+        self.new_threads.pop(old_script, None)
+        if old_script in self.threads:
+            thread = self.remove_thread(old_script)
+            self.push_script(scriptable, script, thread.callback)
+        return script
+
+    def prepare(self, script):
+        """Return the script with constants folded and dead branches removed.
+
+        See :mod:`skip.optimize`.
+
+        """
+        if script not in self.prepared:
+            self.prepared[script] = skip.optimize.prepare(self, script,
+                                                          self.fold_stats)
+        return self.prepared[script]
+
+    def compile(self, script):
+        """Return the :class:`skip.vm.Code` for the script."""
+        if script not in self.code:
+            self.code[script] = skip.vm.compile_script(self,
+                                                       self.prepare(script))
+        return self.code[script]
+
+    def check(self, value):
+        """Resolve a block, or the blocks in a script, and all the blocks
+        inside them, to check they can be run.
+
+        :raises: :class:`kurt.BlockNotSupported`
+
+        """
+        if isinstance(value, (kurt.Script, list)):
+            for block in value:
+                self.check(block)
+        elif isinstance(value, kurt.Block):
+            if value.type.shape != "hat":
+                (value, f) = self.resolve(value)
+            for arg in value.args:
+                self.check(arg)
+
+    def resolve(self, block):
+        """Return the block to run, after any workarounds, and its function.
+
+        :raises: :class:`kurt.BlockNotSupported`
+
+        """
+        if block.type not in self.COMMANDS:
+            workaround = getattr(block.type, '_workaround', None)
+            if not workaround:
+                raise kurt.BlockNotSupported(block.type)
+            block_type = block.type
+            block = workaround(block)
+            if not block:
+                raise kurt.BlockNotSupported(block_type)
+        return (block, self.COMMANDS[block.type])
+
+    def check_condition(self, s, condition):
+        """Evaluate the condition of a "wait until" or "repeat until" block.
+
+        The result is re-used until something the condition reads changes.
+
+        """
+        key = (s, condition)
+        if key not in self.conditions:
+            self.conditions[key] = skip.reactive.Condition(self, s, condition)
+        return self.conditions[key].check()
+
+    def evaluate_slices(self, s, block, out, budget):
+        """Evaluate a reporter like :meth:`evaluate`, appending its value to
+        ``out``. Returns a generator, which evaluates the arguments one at a
+        time, and yields to the next frame whenever it's run for longer than
+        ``budget`` seconds in this one.
+
+        """
+        slice_start = [time.time()]
+        def walk(block, insert, out):
+            (block, f) = self.resolve(block)
+            args = []
+            for (arg, arg_insert) in zip(list(block.args),
+                                         block.type.inserts):
+                if (isinstance(arg, kurt.Block) and arg.args and
+                        not arg_insert.unevaluated):
+                    for x in walk(arg, arg_insert, args):
+                        yield x
+                else:
+                    args.append(self.evaluate(s, arg, arg_insert))
+                if time.time() - slice_start[0] > budget:
+                    yield
+                    slice_start[0] = time.time()
+            out.append(self.evaluate(s, f(s, *args), insert))
+        return walk(block, None, out)
+
     def run_script(self, s, script):
         for block in script:
             for x in self.evaluate(s, block):
@@ -254,15 +762,7 @@ class Interpreter(object):
             if value.type.shape == "hat":
                 return []
 
-            if value.type not in self.COMMANDS:
-                if getattr(value.type, '_workaround', None):
-                    value = value.type._workaround(value)
-                    if not value:
-                        raise kurt.BlockNotSupported(value.type)
-                else:
-                    raise kurt.BlockNotSupported(value.type)
-
-            f = self.COMMANDS[value.type]
+            (value, f) = self.resolve(value)
 
             args = [self.evaluate(s, arg, arg_insert)
                     for (arg, arg_insert)
@@ -284,16 +784,18 @@ class Interpreter(object):
 
         if insert:
             if isinstance(value, basestring):
-                value = unicode(value)
-
                 if insert.shape in ("number", "number-menu", "string"):
-                    try:
-                        value = float(value)
-                    except (TypeError, ValueError):
-                        if insert.shape == "number":
-                            value = 0
+                    number = parse_number(value)
+                    if number is not None:
+                        value = number
+                    elif insert.shape == "number":
+                        value = 0
+                    else:
+                        value = unicode(value)
+                else:
+                    value = unicode(value)
 
-            if isinstance(value, float) and value == int(value):
+            elif isinstance(value, float) and value.is_integer():
                 value = int(value)
 
             if insert.kind in ("spriteOrStage", "spriteOrMouse", "stageOrThis",
@@ -453,6 +955,8 @@ class ScriptEvent(object):
     May then be passed to the Screen.
 
     """
+    __slots__ = ('scriptable', 'kind', 'value')
+
     def __init__(self, scriptable, kind, value=None):
         self.scriptable = scriptable
         self.kind = kind
@@ -468,9 +972,17 @@ class ScriptEvent(object):
     def __unicode__(self):
         return "%s: %s %r" % (self.scriptable.name, self.kind, self.value)
 
+STOP = ScriptEvent(None, "stop")
+"""Yielded when a thread finishes. Shared, so it has no scriptable."""
+
+END_FRAME = ScriptEvent(None, "end frame")
+"""Yielded to end the thread's frame, even inside "all at once"."""
+
 
 class ScreenEvent(object):
     """An event passed from Screen to the Interpreter."""
+    __slots__ = ('kind', 'value')
+
     def __init__(self, kind, value=None):
         self.kind = kind
         self.value = value
@@ -483,10 +995,76 @@ class ScreenEvent(object):
         return r
 
 
+class ActorState(collections.namedtuple('ActorState', ['scriptable',
+        'costume', 'position', 'direction', 'size', 'graphic_effects',
+        'layer'])):
+    """How a scriptable looked at the end of a frame.
+
+    Has the same attributes as a Sprite for :func:`bounds`. Layer 0 is the
+    stage.
+
+    """
+
+    @property
+    def is_stage(self):
+        return isinstance(self.scriptable, kurt.Stage)
+
+
+def actor_state(s, layer):
+    if isinstance(s, kurt.Stage):
+        (position, direction, size) = ((0, 0), 90, 100)
+    else:
+        (position, direction, size) = (tuple(s.position), s.direction, s.size)
+    return ActorState(s, s.costume, position, direction, size,
+                      tuple(s.graphic_effects.items()), layer)
+
+
+class RenderState(object):
+    """Immutable list of :class:`ActorState`, in drawing order.
+
+    Produced by :meth:`Interpreter.tick` when
+    :attr:`Interpreter.keep_render_state` is set, so a Screen can draw from
+    another thread.
+
+    """
+
+    def __init__(self, frame, actors):
+        self.frame = frame
+        self.actors = actors
+
+    def __repr__(self):
+        return "<RenderState(frame %i, %i actors)>" % (self.frame,
+                                                       len(self.actors))
+
+    def interpolate(self, previous, alpha):
+        """Return a RenderState part way from previous to this one.
+
+        Sprites are moved, turned and resized by alpha of the way; anything
+        else is as in this state.
+
+        """
+        before = dict((a.scriptable, a) for a in previous.actors)
+        actors = []
+        for actor in self.actors:
+            old = before.get(actor.scriptable)
+            if old and not actor.is_stage:
+                ((x, y), (ox, oy)) = (actor.position, old.position)
+                turn = (actor.direction - old.direction + 180) % 360 - 180
+                actor = actor._replace(
+                        position=(ox + (x - ox) * alpha,
+                                  oy + (y - oy) * alpha),
+                        direction=old.direction + turn * alpha,
+                        size=old.size + (actor.size - old.size) * alpha)
+            actors.append(actor)
+        return RenderState(self.frame, tuple(actors))
+
+
 class Screen(object):
+    engine = "generator"
+
     def set_project(self, project):
         self.project = project
-        self.interpreter = Interpreter(project).bind(self)
+        self.interpreter = Interpreter(project, self.engine).bind(self)
         self.running = True
 
     def tick(self):
@@ -499,6 +1077,13 @@ class Screen(object):
     def draw_line(self, start, end, color, size):
         pass
 
+    def get_pen_image(self):
+        """Return the contents of the pen layer, for snapshots."""
+        return None
+
+    def set_pen_image(self, data):
+        pass
+
     def get_mouse_pos(self):
         return (0, 0)
 
@@ -516,6 +1101,25 @@ class Screen(object):
         """Filter collide. Bounding boxes already checked."""
         return True
 
+    def cache_report(self):
+        """Return a description of the screen's caches, or None."""
+        return None
+
+    def clock_changed(self):
+        """Called when the interpreter's clock jumps, eg. on restoring a
+        snapshot.
+
+        """
+        pass
+
+    def touching_sprites(self, sprite, others):
+        """Return the sprites in others which sprite is touching. Bounding
+        boxes already checked.
+
+        """
+        return [other for other in others
+                if self.touching_sprite(sprite, other)]
+
     def touching_color(self, sprite, color):
         return False
 
@@ -528,21 +1132,21 @@ class Screen(object):
             yield
         yield ""
 
-    def play_sound(self, sound):
+    def play_sound(self, scriptable, sound):
         pass
 
-    def play_sound_until_done(self, sound):
-        self.play_sound(sound)
+    def play_sound_until_done(self, scriptable, sound):
+        self.play_sound(scriptable, sound)
         while 0: # sync: yield while playing
             yield
 
     def stop_sounds(self):
         pass
 
-    def play_note(self, drum, duration):
+    def play_note(self, scriptable, note, duration):
         pass
 
-    def play_drum(self, drum, duration):
+    def play_drum(self, scriptable, drum):
         pass
 
 
@@ -553,14 +1157,23 @@ class Screen(object):
 # :param s: the Scriptable the block is evaluated on
 # Must be return an iterable (ie. a generator) or None
 
-def command(bt):
+def command(bt, kind=None):
+    """Register a block function.
+
+    :param kind: for reporters, what the value depends on: "pure" for only
+                 the arguments, "attribute" for the project's variables,
+                 lists and sprites, "sensing" for input and the screen.
+
+    """
     def decorator(func, bt=bt):
         bt = kurt.BlockType.get(bt)
         Interpreter.COMMANDS[bt] = func
+        if kind:
+            Interpreter.KINDS[bt] = kind
         return func
     return decorator
 
-def operator(bt, func, arg_types=None):
+def operator(bt, func, arg_types=None, kind="pure"):
     def wrapped(s, *args):
         if arg_types:
             cast_args = []
@@ -572,7 +1185,7 @@ def operator(bt, func, arg_types=None):
             return func(*args)
         except IndexError:
             return ""
-    return command(bt)(wrapped)
+    return command(bt, kind)(wrapped)
 
 def sensing(bt, method_name, after=None):
     def wrapped(s, *args):
@@ -581,7 +1194,17 @@ def sensing(bt, method_name, after=None):
         if after:
             result = after(result)
         return result
-    return command(bt)(wrapped)
+    return command(bt, "sensing")(wrapped)
+
+def extension(category, shape, command, parts):
+    """Add a block which Scratch doesn't have. It can be used in scripts
+    parsed with :func:`kurt.text.parse`, but not saved.
+
+    """
+    pbt = kurt.PluginBlockType(category, shape, command, parts)
+    pbt.format = "skip"
+    kurt.plugin.Kurt.blocks.append(kurt.BlockType(pbt))
+    return command
 
 ## Motion
 
@@ -620,9 +1243,9 @@ def point_towards(s, sprite):
 def set_position(s, x, y=None):
     if y is None:
         (x, y) = x
-    if s.is_pen_down:
-        s.project.interpreter.screen.draw_line(s.position, (x, y), s.pen_color,
-                                               s.pen_size)
+    if s.pen.is_down:
+        s.project.interpreter.screen.draw_line(s.position, (x, y),
+                                               s.pen.color, s.pen.size)
         # TODO pen_shade ?
         # TODO pen_hue ?
     s.position = (x, y)
@@ -637,14 +1260,15 @@ def go_to_sprite(s, sprite):
 @command("glide secs to x: y:")
 def glide_to_for_secs(s, duration, end_x, end_y):
     (start_x, start_y) = s.position
-    start_time = now = time.time()
+    start_time = now = s.project.interpreter.now()
     end_time = now + duration
     while now <= end_time:
-        t = float(now - start_time) / duration
+        t = float(now - start_time) / duration if duration else 1
         set_position(s, start_x * (1 - t)  +  end_x * t,
                         start_y * (1 - t)  +  end_y * t)
-        yield
-        now = time.time()
+        yield s.project.interpreter.timing_yield()
+        now = s.project.interpreter.now()
+    set_position(s, end_x, end_y)
 
 @command("change x by")
 def change_x(s, delta):
@@ -670,15 +1294,15 @@ def set_y(s, value):
 
 # TODO if on edge, bounce
 
-@command("x position")
+@command("x position", "attribute")
 def get_x(s):
     return s.position[0]
 
-@command("y position")
+@command("y position", "attribute")
 def get_y(s):
     return s.position[1]
 
-@command("direction")
+@command("direction", "attribute")
 def get_direction(s):
     return (s.direction + 179) % 360  -  179
 
@@ -699,7 +1323,7 @@ def set_costume(s, name):
 def next_costume(s):
     s.costume_index = (s.costume_index + 1) % len(s.costumes)
 
-@command("costume #")
+@command("costume #", "attribute")
 def get_costume_number(s):
     return s.costume_index + 1
 
@@ -744,28 +1368,27 @@ def change_size(s, delta):
 def set_size(s, value):
     s.size = value
 
-@command("size")
+@command("size", "attribute")
 def get_size(s):
     return s.size
 
 @command("show")
 def show(s):
     s.is_visible = True
+    s.project.interpreter.layers.invalidate()
 
 @command("hide")
 def hide(s):
     s.is_visible = False
+    s.project.interpreter.layers.invalidate()
 
 @command("go to front")
 def go_to_front(s):
-    s.project.actors.remove(s)
-    s.project.actors.append(s)
+    s.project.interpreter.layers.go_to_front(s)
 
 @command("go back layers")
 def go_back_by(s, n):
-    index = s.project.actors.index(s)
-    s.project.actors.remove(s)
-    s.project.actors.insert(max(0, index - n), s)
+    s.project.interpreter.layers.go_back_by(s, n)
 
 @command("switch backdrop to")
 def switch_backdrop(s, name):
@@ -775,7 +1398,7 @@ def switch_backdrop(s, name):
 def next_backdrop(s):
     return next_costume(s.project.stage)
 
-@command("background #")
+@command("background #", "attribute")
 def background_number(s):
     return costume_number(s.project.stage)
 
@@ -783,31 +1406,36 @@ def background_number(s):
 
 @command("play sound")
 def play_sound(s, sound):
-    s.project.interpreter.screen.play_sound(sound)
+    if isinstance(sound, kurt.Sound):
+        s.project.interpreter.screen.play_sound(s, sound)
 
 @command("play sound until done")
 def play_sound_until_done(s, sound):
-    return s.project.interpreter.screen.play_sound_until_done(sound)
+    if isinstance(sound, kurt.Sound):
+        return s.project.interpreter.screen.play_sound_until_done(s, sound)
 
 @command("stop all sounds")
 def stop_sounds(s):
     s.project.interpreter.screen.stop_sounds()
 
 def beat_seconds(s, beats):
-    seconds_per_beat = 60 / s.project.tempo
+    seconds_per_beat = 60.0 / s.project.tempo
     return beats * seconds_per_beat
 
 @command("rest for beats")
 def rest_beats(s, beats):
-    return wait(beat_seconds(beats))
+    return wait(s, beat_seconds(s, beats))
 
 @command("play drum for beats")
 def play_drum(s, drum, beats):
-    s.project.interpreter.screen.play_drum(drum, beat_seconds(beats))
+    s.project.interpreter.screen.play_drum(s, drum)
+    return wait(s, beat_seconds(s, beats))
 
 @command("play note for beats")
 def play_note(s, note, beats):
-    s.project.interpreter.screen.play_note(note, beat_seconds(beats))
+    duration = beat_seconds(s, beats)
+    s.project.interpreter.screen.play_note(s, note, duration)
+    return wait(s, duration)
 
 @command("set instrument to")
 def set_instrument(s, value):
@@ -821,7 +1449,7 @@ def change_volume(s, delta):
 def set_volume(s, value):
     s.volume = value
 
-@command("volume")
+@command("volume", "attribute")
 def get_volume(s):
     return s.volume
 
@@ -833,7 +1461,7 @@ def change_tempo(s, delta):
 def set_tempo(s, value):
     s.project.tempo = value
 
-@command("tempo")
+@command("tempo", "attribute")
 def get_tempo(s):
     return s.project.tempo
 
@@ -845,39 +1473,39 @@ def clear(s):
 
 @command("pen down")
 def pen_down(s):
-    s.is_pen_down = True
+    s.pen.is_down = True
 
 @command("pen up")
 def pen_up(s):
-    s.is_pen_down = False
+    s.pen.is_down = False
 
 @command("penColor:")
 def set_pen_color(s, color):
-    s.pen_color = color
+    s.pen.color = color
 
 @command("changePenHueBy:")
 def change_pen_hue(s, delta):
-    s.pen_hue += delta
+    s.pen.hue += delta
 
 @command("setPenHueTo:")
 def set_pen_hue(s, value):
-    s.pen_hue = value
+    s.pen.hue = value
 
 @command("change pen shade by")
 def change_pen_shade(s, delta):
-    s.pen_shade += delta
+    s.pen.shade += delta
 
 @command("set pen shade to")
 def set_pen_shade(s, value):
-    s.pen_shade = value
+    s.pen.shade = value
 
 @command("change pen size by")
 def change_pen_size(s, delta):
-    s.pen_size += delta
+    s.pen.size += delta
 
 @command("set pen size to")
 def set_pen_size(s, value):
-    s.pen_size = value
+    s.pen.size = value
 
 @command("stamp")
 def stamp(s):
@@ -887,9 +1515,10 @@ def stamp(s):
 
 @command("wait secs")
 def wait(s, duration):
-    end_time = time.time() + duration
-    while time.time() <= end_time:
-        yield
+    interpreter = s.project.interpreter
+    end_time = interpreter.now() + duration
+    while interpreter.now() <= end_time:
+        yield interpreter.timing_yield()
 
 @command("forever")
 def forever(s, body):
@@ -934,12 +1563,12 @@ def if_else(s, condition, body, other_body):
 
 @command("wait until")
 def wait_until(s, condition):
-    while not s.project.interpreter.evaluate(s, condition):
+    while not s.project.interpreter.check_condition(s, condition):
         yield
 
 @command("repeat until")
 def repeat_until(s, condition, body):
-    while not s.project.interpreter.evaluate(s, condition):
+    while not s.project.interpreter.check_condition(s, condition):
         yield s.project.interpreter.run_script(s, body)
         yield
 
@@ -1000,26 +1629,42 @@ def bounds(s):
 
     return Rect(left, bottom, width, height)
 
-@command("touching")
+@command("touching", "sensing")
 def touching_sprite(s, sprite):
-    rect = bounds(s)
+    interpreter = s.project.interpreter
     if sprite == "edge":
+        rect = interpreter.get_bounds(s)
         return (rect.left < -240 or rect.right > 240 or rect.top > 180 or
                 rect.bottom < -180)
     elif sprite == "mouse-pointer":
-        mouse_pos = s.project.interpreter.screen.get_mouse_pos()
-        return (rect.collide_point(mouse_pos)
-                and s.project.interpreter.screen.touching_mouse(s))
+        mouse_pos = interpreter.screen.get_mouse_pos()
+        return (interpreter.get_bounds(s).collide_point(mouse_pos)
+                and interpreter.screen.touching_mouse(s))
     else:
-        other_rect = bounds(sprite)
-        return (rect.collide_rect(other_rect) and
-                s.project.interpreter.screen.touching_sprite(s, sprite))
-
-@command("touching color")
+        return bool(interpreter.touching_sprites(s, [sprite]))
+
+@command(extension("sensing", "boolean", "skip:touchingAnyOf:",
+                   ["touching any of ", kurt.Insert("readonly-menu", "list"),
+                    "?"]), "sensing")
+def touching_any_of(s, names):
+    interpreter = s.project.interpreter
+    others = [o for o in interpreter.sprites_in(names.items) if o is not s]
+    return bool(interpreter.touching_sprites(s, others))
+
+@command(extension("sensing", "reporter", "skip:nearestOf:",
+                   ["nearest of ", kurt.Insert("readonly-menu", "list")]),
+         "sensing")
+def nearest_of(s, names):
+    interpreter = s.project.interpreter
+    others = [o for o in interpreter.sprites_in(names.items) if o is not s]
+    nearest = interpreter.nearest_sprite(s, others)
+    return nearest.name if nearest else ""
+
+@command("touching color", "sensing")
 def touching_color(s, color):
     return s.project.interpreter.screen.touching_color(s, color)
 
-@command("color is touching")
+@command("color is touching", "sensing")
 def touching_color(s, color, over):
     return s.project.interpreter.screen.touching_color_over(s, color, over)
 
@@ -1035,7 +1680,7 @@ def ask(s, prompt):
         yield
     s.project.interpreter.ask_lock = False
 
-@command("answer")
+@command("answer", "attribute")
 def answer(s):
     return s.project.interpreter.answer
 
@@ -1044,7 +1689,7 @@ sensing("mouse y", "get_mouse_pos", lambda (x, y): y)
 sensing("mouse down?", "is_mouse_down")
 sensing("key pressed?", "is_key_pressed")
 
-@command("distance to")
+@command("distance to", "sensing")
 def distance_to(s, sprite):
     (x, y) = s.position
     if sprite == "mouse-pointer":
@@ -1055,13 +1700,13 @@ def distance_to(s, sprite):
 
 @command("reset timer")
 def reset_timer(s):
-    s.project.interpreter.timer_start = time.time()
+    s.project.interpreter.timer_start = s.project.interpreter.now()
 
-@command("timer")
+@command("timer") # changes within a frame, so it's never cached
 def timer(s):
-    return time.time() - s.project.interpreter.timer_start
+    return s.project.interpreter.now() - s.project.interpreter.timer_start
 
-@command("getAttribute:of:")
+@command("getAttribute:of:", "attribute")
 def attribute_of(s, name, sprite):
     attr_functions = {
         'x position': get_x,
@@ -1077,7 +1722,7 @@ def attribute_of(s, name, sprite):
     else:
         return sprite.variables[name].value
 
-@command("loudness")
+@command("loudness", "sensing")
 def loudness(s):
     return 20
 
@@ -1088,7 +1733,7 @@ operator("-", op.sub)
 operator("*", op.mul)
 operator("/", op.truediv)
 
-operator("pick random to", random.randint)
+operator("pick random to", random.randint, kind=None)
 
 operator("=", op.eq)
 operator("<", op.lt)
@@ -1105,7 +1750,7 @@ operator("stringLength:", len, [unicode])
 operator("mod", op.mod)
 operator("round", round)
 
-@command("computeFunction:of:")
+@command("computeFunction:of:", "pure")
 def math_function(s, name, arg):
     functions = {
         'abs': abs,
@@ -1126,7 +1771,7 @@ def math_function(s, name, arg):
 
 ## Variables
 
-@command("var")
+@command("var", "attribute")
 def get_variable(s, variable):
     return variable.value
 
@@ -1136,7 +1781,10 @@ def set_variable(s, variable, value):
 
 @command("change by")
 def change_variable(s, variable, delta):
-    variable.value = float(variable.value) + float(delta)
+    value = variable.value
+    if not isinstance(value, (int, float)):
+        value = parse_number(value) or 0
+    variable.value = float(value) + delta
 
 @command("show variable")
 def show_variable(s, variable):
@@ -1148,7 +1796,7 @@ def hide_variable(s, variable):
 
 ## Lists
 
-@command("list")
+@command("list", "attribute")
 def get_list(s, list_):
     return " ".join(list_.items) # TODO correct behaviour
 
@@ -1183,15 +1831,58 @@ def replace_item_with(s, index, list_, item):
         index = random.randint(1, len(l.items))
     list_.items[int(index - 1)] = item
 
-operator("item of", lambda i, list_: list_.items[int(i - 1)])
-operator("lineCountOfList:", lambda list_: len(list_.items))
-operator("contains", lambda list_, item: item in list_.items)
+operator("item of", lambda i, list_: list_.items[int(i - 1)],
+         kind="attribute")
+operator("lineCountOfList:", lambda list_: len(list_.items), kind="attribute")
+operator("contains", lambda list_, item: item in list_.items,
+         kind="attribute")
 
 
 
 #-- REPL --#
 
-def main(project, screen):
+def print_error(error):
+    print "%s: %s" % (error.__class__.__name__, error)
+
+EDIT_USAGE = "`edit N` followed by blocks to replace script N"
+
+def parse_edit(command, count):
+    """Return the index of the script an ``edit N`` command replaces, or
+    ``None`` if N isn't one of the ``count`` scripts.
+
+    """
+    words = command.split()
+    if len(words) == 2 and words[1].isdigit():
+        index = int(words[1]) - 1
+        if 0 <= index < count:
+            return index
+
+def start_profiler(interpreter, path=None):
+    """Start a :class:`skip.profiler.Profiler`, which prints its report when
+    Python exits -- or writes it to a file, if given a path.
+
+    """
+    import skip.profiler # it imports this module
+    profiler = skip.profiler.Profiler(interpreter)
+    profiler.start()
+    def report():
+        profiler.stop()
+        if path:
+            with open(path, "w") as f:
+                f.write(profiler.report() + "\n")
+        else:
+            print
+            print profiler.report()
+    atexit.register(report)
+    return profiler
+
+def main(project, screen, profile=False):
+    """Run a project on a screen, reading blocks to evaluate from stdin.
+
+    :param profile: profile the project; True prints the report on exit,
+                    or give a path to write it to.
+
+    """
     if project is None:
         project = kurt.Project()
         sprite = kurt.Sprite(project, "Sprite1")
@@ -1207,15 +1898,22 @@ def main(project, screen):
 
     interpreter = screen.interpreter
     interpreter.start()
+    profiler = None
+    if profile:
+        profiler = start_profiler(interpreter,
+                                  None if profile is True else profile)
 
     def signal_handler(signal, frame):
         sys.exit(0)
     signal.signal(signal.SIGINT, signal_handler)
 
     log = []
+    checkpoint = None
     print "Other commands:"
-    print "  " + ", ".join(['start', 'stop', 'save', 'history', 'scripts',
-                     'variables', 'lists', 'sprites', 'exit'])
+    print "  " + ", ".join(['start', 'stop', 'save', 'snapshot', 'restore',
+                     'stats', 'profile', 'history', 'scripts', 'threads',
+                     'pause', 'resume', 'variables', 'lists', 'sprites',
+                     'exit'])
     print "Ctrl+D or `;` to evaluate blocks"
     print "=>%s" % sprite.name
     while screen.running:
@@ -1244,14 +1942,55 @@ def main(project, screen):
                 interpreter.stop()
                 text = ""
             elif text == "save":
+                interpreter.sync_layers()
                 path = project.save()
                 print "Saved to %r" % path
                 text = ""
+            elif text == "snapshot":
+                start_time = time.time()
+                checkpoint = interpreter.snapshot()
+                print "%r in %.1fms" % (checkpoint,
+                                        (time.time() - start_time) * 1000)
+                text = ""
+            elif text == "restore":
+                if checkpoint:
+                    interpreter.restore(checkpoint)
+                    print "Restored %r" % checkpoint
+                else:
+                    print "No snapshot"
+                text = ""
+            elif text == "stats":
+                print interpreter.fold_stats.report()
+                if screen.cache_report():
+                    print screen.cache_report()
+                text = ""
+            elif text == "profile":
+                if profiler:
+                    print profiler.report()
+                else:
+                    profiler = start_profiler(interpreter)
+                    print "Profiling. `profile` again to see the report"
+                text = ""
             elif text == "scripts":
                 print
-                print "\n\n".join(s.stringify() for s in sprite.scripts)
+                print "\n\n".join("#%i\n%s" % (i + 1, s.stringify())
+                                  for (i, s) in enumerate(sprite.scripts))
+                print
+                print EDIT_USAGE
                 print
                 text = ""
+            elif text == "threads":
+                for (script, thread) in interpreter.threads_of(sprite):
+                    print "* " + script.blocks[0].stringify()
+                if sprite in interpreter.paused:
+                    print "(paused)"
+                text = ""
+            elif text == "pause":
+                interpreter.pause(sprite)
+                text = ""
+            elif text == "resume":
+                interpreter.resume(sprite)
+                text = ""
             elif text == "variables":
                 print "\n".join("* "+name for name in sprite.project.variables)
                 print "--"
@@ -1290,6 +2029,14 @@ def main(project, screen):
         text = text.rstrip().rstrip(";")
         if text:
             log.append(text)
+            edit_index = None
+            (command, _, rest) = text.partition("\n")
+            if command.split()[:1] == ["edit"]:
+                edit_index = parse_edit(command, len(sprite.scripts))
+                if edit_index is None or not rest.strip():
+                    print "%s (%i scripts)" % (EDIT_USAGE, len(sprite.scripts))
+                    continue
+                text = rest
             try:
                 script = kurt.text.parse(text.strip(), sprite)
             except SyntaxError, e:
@@ -1299,23 +2046,32 @@ def main(project, screen):
                 print "%s: %s" % (e.__class__.__name__, e.msg)
             else:
                 try:
-                    if len(script) == 1 and script[0].type.shape in ("reporter",
+                    if edit_index is not None:
+                        interpreter.replace_script(sprite, edit_index, script)
+                        print "=>Replaced script %i." % (edit_index + 1)
+                    elif len(script) == 1 and script[0].type.shape in ("reporter",
                                                                   "boolean"):
-                        print repr(interpreter.evaluate(sprite, script[0]))
+                        # Runs as a thread, so the frame rate holds up
+                        def show(value, error):
+                            if error:
+                                print_error(error)
+                            else:
+                                print repr(value)
+                        interpreter.push_reporter(sprite, script[0], show)
                     else:
                         if script[0].type.shape == "hat":
-                            sprite.scripts.append(script)
+                            interpreter.add_script(sprite, script)
                             print "=>Ok."
                         else:
+                            interpreter.check(script)
                             print "..."
-                            evaluating = [True] # pass bool by reference
-                            def done(thread, evaluating=evaluating):
-                                evaluating[0] = False
+                            def done(thread):
+                                print "=>Done."
+                            def failed(thread, error):
+                                print_error(error)
                             interpreter.push_script(sprite, script,
-                                                    callback=done)
-                            if not script[-1].type.has_command("doForever"):
-                                while evaluating[0] and screen.running:
-                                    screen.tick()
+                                                    callback=done,
+                                                    errback=failed)
                 except kurt.BlockNotSupported, e:
-                    print "%s: %s" % (e.__class__.__name__, e.message)
+                    print_error(e)
 
@@ -0,0 +1,150 @@
+"""Decoded costume images, shared by every screen in the process.
+
+A :class:`skip.pygame_screen.PygameScreen` needs a Surface and a collision
+mask for each costume it draws. When several run in one process -- eg. many
+runs of the same project -- they get them from :data:`store`, which keeps one
+copy of each, keyed by a hash of the image's data. So projects with costumes
+in common share those too. Images are hashed before they're decoded, and
+only the store keeps the decoded copy.
+
+Screens :meth:`~AssetStore.acquire` the images they use and
+:meth:`~AssetStore.release` them when they're done; an asset is dropped when
+nothing holds it any more. Shared surfaces must never be drawn onto.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+from cStringIO import StringIO
+import hashlib
+import threading
+import weakref
+
+import PIL.Image
+import pygame
+
+import skip.lazy
+
+
+
+class Asset(object):
+    """A decoded costume image. The mask is made on first use."""
+    __slots__ = ('key', 'surface', '_mask', 'refs')
+
+    def __init__(self, key, surface):
+        self.key = key
+        self.surface = surface
+        self._mask = None
+        self.refs = 0
+
+    def __repr__(self):
+        return "<Asset(%s, %i refs)>" % (self.key[:8], self.refs)
+
+    @property
+    def mask(self):
+        if self._mask is None:
+            self._mask = pygame.mask.from_surface(self.surface)
+        return self._mask
+
+
+def content_hash(image):
+    """Hash an image's data, without decoding it if it hasn't been."""
+    if isinstance(image, skip.lazy.LazyImage):
+        digest = hashlib.sha1("lazy")
+        for part in image.source:
+            digest.update(part)
+    elif image._pil_image is None:
+        digest = hashlib.sha1(image.format or "")
+        digest.update(image.contents)
+    else:
+        p_i = image.pil_image
+        digest = hashlib.sha1(p_i.mode)
+        digest.update(repr(p_i.size))
+        digest.update(p_i.tostring())
+    return digest.hexdigest()
+
+def load_pil_image(image):
+    """Return the :class:`PIL.Image.Image` for a :class:`kurt.Image`. Unlike
+    :attr:`~kurt.Image.pil_image`, it isn't kept on the image, so every
+    project sharing an asset doesn't hold its own decoded copy.
+
+    """
+    if isinstance(image, skip.lazy.LazyImage):
+        return image.decode()
+    elif image._pil_image is None:
+        return PIL.Image.open(StringIO(image.contents))
+    return image._pil_image
+
+def decode(image):
+    """Return a Surface for a :class:`kurt.Image`."""
+    p_i = load_pil_image(image)
+    if p_i.mode not in ("RGB", "RGBA"):
+        p_i = p_i.convert("RGBA")
+    return pygame.image.fromstring(p_i.tostring(), p_i.size,
+                                   p_i.mode).convert_alpha()
+
+
+class AssetStore(object):
+    """Reference-counted :class:`Asset` objects by content hash."""
+
+    def __init__(self):
+        self.assets = {} # hash: Asset
+        self.hashes = weakref.WeakKeyDictionary() # image: hash
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "<AssetStore(%i assets, %i hits, %i misses)>" % (
+                len(self.assets), self.hits, self.misses)
+
+    def __len__(self):
+        return len(self.assets)
+
+    def key(self, image):
+        """Return the content hash of an image, which is only worked out
+        once per image object.
+
+        """
+        key = self.hashes.get(image)
+        if key is None:
+            key = self.hashes[image] = content_hash(image)
+        return key
+
+    def acquire(self, image):
+        """Return the :class:`Asset` for an image, decoding it if no-one
+        else has. Call :meth:`release` when it's no longer needed.
+
+        """
+        key = self.key(image)
+        with self.lock:
+            asset = self.assets.get(key)
+            if asset is None:
+                self.misses += 1
+                asset = self.assets[key] = Asset(key, decode(image))
+            else:
+                self.hits += 1
+            asset.refs += 1
+        return asset
+
+    def release(self, asset):
+        with self.lock:
+            asset.refs -= 1
+            if asset.refs <= 0:
+                self.assets.pop(asset.key, None)
+
+
+store = AssetStore()
@@ -0,0 +1,399 @@
+"""Sound for the Pygame screen.
+
+A single software :class:`Mixer` adds up every playing :class:`Voice` into
+one buffer, which is written to a sink:
+
+* :class:`PygameSink` queues it on a pygame mixer channel. The mixer runs
+  in its own :class:`AudioThread`, rendering ahead of the sound device.
+
+* :class:`WaveSink` writes it to a WAV file, and :class:`NullSink` throws it
+  away. These aren't realtime: the screen renders up to the interpreter's
+  clock after each frame, so a run renders the same audio however fast it
+  goes -- eg. when testing without a sound device.
+
+Sounds are decoded to NumPy arrays once. Notes and drums are synthesised
+the first time they're played with each instrument, and cached.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+from cStringIO import StringIO
+import atexit
+import threading
+import time
+import wave
+
+import numpy
+import pygame
+
+
+
+RATE = 22050
+BLOCK_SIZE = 1024 # samples rendered at a time by AudioThread
+
+NOTE_LENGTH = 2.0 # seconds of each note to synthesise up-front
+RELEASE = 0.02    # fade out at the end of a note, in seconds
+
+
+class Voice(object):
+    """A sound being played."""
+
+    def __init__(self, samples, volume, owner=None, key=None):
+        self.samples = samples
+        self.volume = volume
+        self.owner = owner
+        self.key = key
+        self.position = 0
+
+    def __repr__(self):
+        return "<Voice(%i/%i)>" % (self.position, len(self.samples))
+
+    @property
+    def is_done(self):
+        return self.position >= len(self.samples)
+
+    def stop(self):
+        """Skip to the end, so anything waiting for it to finish stops."""
+        self.position = len(self.samples)
+
+
+class Mixer(object):
+    """Mixes voices into a mono 16-bit stream at :data:`RATE`."""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.voices = []
+        self.lock = threading.Lock()
+        self.rendered = 0 # samples
+        self.thread = None
+
+        self.sounds = {}
+        self.notes = {}
+        self.drums = {}
+        self.release = numpy.linspace(1, 0, int(RELEASE * RATE)).astype(
+                numpy.float32)
+
+    def __repr__(self):
+        return "<Mixer(%r, %i voices)>" % (self.sink, len(self.voices))
+
+    def start(self):
+        """Start rendering on an :class:`AudioThread`, if the sink plays
+        in real time.
+
+        """
+        if self.sink.realtime and not self.thread:
+            self.thread = AudioThread(self)
+            self.thread.start()
+            atexit.register(self.close) # before pygame quits
+
+    def close(self):
+        if self.thread:
+            self.thread.running = False
+            self.thread.join()
+            self.thread = None
+        self.sink.close()
+
+    # Playing
+
+    def play(self, samples, volume=100, owner=None, key=None):
+        """Start playing samples. A voice with the same owner and key is
+        restarted.
+
+        """
+        voice = Voice(samples, max(0, min(volume, 100)) / 100.0, owner, key)
+        with self.lock:
+            if key is not None:
+                for other in self.voices:
+                    if (other.owner, other.key) == (owner, key):
+                        other.stop()
+                self.voices = [v for v in self.voices if not v.is_done]
+            self.voices.append(voice)
+        return voice
+
+    def play_sound(self, sound, volume=100, owner=None):
+        return self.play(self.get_sound(sound), volume, owner, sound)
+
+    def play_note(self, note, duration, instrument=1, volume=100):
+        samples = self.get_note(instrument, note, duration)
+        count = int(duration * RATE)
+        if count < len(samples):
+            samples = samples[:count + len(self.release)].copy()
+            samples[-len(self.release):] *= self.release[:len(samples)]
+        return self.play(samples, volume)
+
+    def play_drum(self, drum, volume=100):
+        return self.play(self.get_drum(drum), volume)
+
+    def stop_all(self):
+        with self.lock:
+            for voice in self.voices:
+                voice.stop()
+            self.voices = []
+
+    # Rendering
+
+    def render(self, count):
+        """Return the next count samples, as 16-bit integers."""
+        out = numpy.zeros(count, numpy.float32)
+        with self.lock:
+            for voice in self.voices:
+                chunk = voice.samples[voice.position:voice.position + count]
+                out[:len(chunk)] += chunk * voice.volume
+                voice.position += count
+            self.voices = [v for v in self.voices if not v.is_done]
+        self.rendered += count
+        numpy.clip(out, -1, 1, out)
+        return (out * 32767).astype(numpy.int16)
+
+    def rebase(self, seconds):
+        """Carry on rendering from a time since starting, after the clock
+        :meth:`render_until` is given has been changed.
+
+        """
+        with self.lock:
+            self.rendered = int(seconds * RATE)
+
+    def render_until(self, seconds):
+        """Render to the sink up to a time since starting, for sinks which
+        aren't realtime.
+
+        """
+        count = int(seconds * RATE) - self.rendered
+        if count > 0:
+            self.sink.write(self.render(count))
+
+    # Caches
+
+    def get_sound(self, sound):
+        waveform = sound.waveform
+        if waveform not in self.sounds:
+            self.sounds[waveform] = decode(waveform.contents)
+        return self.sounds[waveform]
+
+    def get_note(self, instrument, note, duration=0):
+        key = (instrument, note)
+        samples = self.notes.get(key)
+        if samples is None or len(samples) < (duration + RELEASE) * RATE:
+            length = max(NOTE_LENGTH, duration + RELEASE)
+            samples = self.notes[key] = synthesise_note(instrument, note,
+                                                        length)
+        return samples
+
+    def get_drum(self, drum):
+        if drum not in self.drums:
+            self.drums[drum] = synthesise_drum(drum)
+        return self.drums[drum]
+
+
+
+#-- Sinks --#
+
+class NullSink(object):
+    realtime = False
+
+    def __repr__(self):
+        return "<NullSink>"
+
+    def write(self, samples):
+        pass
+
+    def close(self):
+        pass
+
+
+class WaveSink(object):
+    """Writes audio to a mono 16-bit WAV file."""
+
+    realtime = False
+
+    def __init__(self, path):
+        self.path = path
+        self.wave = wave.open(path, "wb")
+        self.wave.setnchannels(1)
+        self.wave.setsampwidth(2)
+        self.wave.setframerate(RATE)
+
+    def __repr__(self):
+        return "<WaveSink(%r)>" % self.path
+
+    def write(self, samples):
+        self.wave.writeframes(samples.astype("<i2").tostring())
+
+    def close(self):
+        self.wave.close()
+
+
+class PygameSink(object):
+    """Plays audio on the sound device. :meth:`create` returns None if
+    there isn't one.
+
+    """
+
+    realtime = True
+
+    def __init__(self):
+        (frequency, size, self.channels) = pygame.mixer.get_init()
+        self.channel = pygame.mixer.Channel(0)
+
+    def __repr__(self):
+        return "<PygameSink>"
+
+    @classmethod
+    def create(cls):
+        try:
+            pygame.mixer.pre_init(RATE, -16, 1, BLOCK_SIZE)
+            pygame.mixer.init()
+        except pygame.error:
+            return None
+        if not pygame.mixer.get_init():
+            return None
+        return cls()
+
+    def wants_data(self):
+        return self.channel.get_queue() is None
+
+    def write(self, samples):
+        if self.channels > 1:
+            samples = numpy.repeat(samples[:, None], self.channels, axis=1)
+        sound = pygame.sndarray.make_sound(samples)
+        if self.channel.get_busy():
+            self.channel.queue(sound)
+        else:
+            self.channel.play(sound)
+
+    def close(self):
+        self.channel.stop()
+
+
+class AudioThread(threading.Thread):
+    """Renders blocks for a realtime sink whenever its queue runs low."""
+
+    def __init__(self, mixer):
+        threading.Thread.__init__(self, name="skip audio")
+        self.daemon = True
+        self.mixer = mixer
+        self.running = True
+
+    def run(self):
+        sink = self.mixer.sink
+        block_time = float(BLOCK_SIZE) / RATE
+        while self.running:
+            if sink.wants_data():
+                sink.write(self.mixer.render(BLOCK_SIZE))
+            else:
+                time.sleep(block_time / 4)
+
+
+
+#-- Synthesis --#
+
+def decode(contents):
+    """Return the samples of a WAV file as floats at :data:`RATE`."""
+    f = wave.open(StringIO(contents))
+    (channels, width, rate, count) = f.getparams()[:4]
+    data = f.readframes(count)
+    f.close()
+
+    if width == 1:
+        samples = (numpy.fromstring(data, numpy.uint8) - 128.0) / 128
+    else:
+        samples = numpy.fromstring(data, "<i2") / 32768.0
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != RATE and len(samples):
+        times = numpy.arange(int(len(samples) * float(RATE) / rate))
+        samples = numpy.interp(times * float(rate) / RATE,
+                               numpy.arange(len(samples)), samples)
+    return samples.astype(numpy.float32)
+
+# The 128 MIDI instruments come in 16 families of 8. For each:
+# (harmonic amplitudes, attack secs, decay secs or None to sustain)
+FAMILIES = [
+    ([1, .5, .25, .12], .005, 1.0),           # piano
+    ([1, 0, .3, 0, .1], .002, 1.5),           # chromatic percussion
+    ([1, .6, .4, .3, .2], .01, None),         # organ
+    ([1, .7, .4, .2, .1], .002, .8),          # guitar
+    ([1, .4, .1], .005, 1.2),                 # bass
+    ([1, .5, .33, .25], .05, None),           # strings
+    ([1, .5, .33, .25], .08, None),           # ensemble
+    ([1, .8, .6, .4, .3], .03, None),         # brass
+    ([1, 0, .5, 0, .3], .02, None),           # reed
+    ([1, .1, .05], .03, None),                # pipe
+    ([1, .5, .33, .25, .2, .17], .01, None),  # synth lead
+    ([1, .3, .1], .2, None),                  # synth pad
+    ([1, .5], .05, .8),                       # synth effects
+    ([1, .5, .3], .005, 1.0),                 # ethnic
+    ([1, .2], .001, .3),                      # percussive
+    ([1, .5, .5, .5], .01, .5),               # sound effects
+]
+
+def synthesise_note(instrument, note, length=NOTE_LENGTH):
+    (harmonics, attack, decay) = FAMILIES[(int(instrument) - 1) % 128 // 8]
+    frequency = 440 * 2 ** ((note - 69) / 12.0)
+    t = numpy.arange(int(length * RATE)) / float(RATE)
+    samples = numpy.zeros(len(t))
+    for (n, amplitude) in enumerate(harmonics, 1):
+        if amplitude and frequency * n < RATE / 2:
+            samples += amplitude * numpy.sin(2 * numpy.pi * frequency * n * t)
+    samples *= 0.5 / sum(harmonics)
+
+    envelope = numpy.minimum(t / attack, 1)
+    if decay:
+        envelope *= numpy.exp(-t / decay)
+    return (samples * envelope).astype(numpy.float32)
+
+def synthesise_drum(drum):
+    """Approximate the General MIDI percussion sounds (35-81)."""
+    drum = int(drum)
+    noise = numpy.random.RandomState(drum)
+    def sweep(start, end, decay):
+        t = numpy.arange(int(decay * 5 * RATE)) / float(RATE)
+        frequency = end + (start - end) * numpy.exp(-t / (decay / 2))
+        phase = 2 * numpy.pi * numpy.cumsum(frequency) / RATE
+        return numpy.sin(phase) * numpy.exp(-t / decay)
+    def hiss(decay, bright=False):
+        t = numpy.arange(int(decay * 5 * RATE)) / float(RATE)
+        samples = noise.uniform(-1, 1, len(t))
+        if bright:
+            samples = numpy.diff(samples, prepend=0) / 2
+        return samples * numpy.exp(-t / decay)
+    def mix(a, b):
+        if len(a) < len(b):
+            (a, b) = (b, a)
+        a = a.copy()
+        a[:len(b)] += b
+        return a
+
+    if drum in (35, 36):                    # bass drum
+        samples = sweep(150, 50, .15)
+    elif drum in (38, 40):                  # snare
+        samples = mix(hiss(.08) * .6, sweep(220, 180, .05))
+    elif drum in (37, 39):                  # side stick, clap
+        samples = hiss(.02)
+    elif drum in (41, 43, 45, 47, 48, 50):  # toms
+        pitch = 80 + (drum - 41) * 15
+        samples = sweep(pitch * 1.4, pitch, .12)
+    elif drum in (42, 44):                  # closed hi-hat
+        samples = hiss(.02, True)
+    elif drum == 46:                        # open hi-hat
+        samples = hiss(.12, True)
+    elif drum in (49, 51, 52, 53, 55, 57, 59): # cymbals
+        samples = hiss(.4, True)
+    else:
+        pitch = 200 + (drum - 35) * 20
+        samples = mix(sweep(pitch, pitch, .06), hiss(.03) * .3)
+    return (samples * 0.7).astype(numpy.float32)
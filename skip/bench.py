@@ -0,0 +1,477 @@
+"""Benchmarks for the Scratch interpreter.
+
+Usage:
+
+    $ python -m skip.bench [game.sb]
+
+Without a project, a large synthetic one is generated.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import inspect
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+import kurt
+import kurt.plugin
+import kurt.scratch14
+from kurt.scratch14.fixed_objects import ByteArray
+import PIL.Image
+import PIL.ImageDraw
+import skip
+import skip.lazy
+import skip.vm
+
+
+
+SPRITE_SCRIPT = """when green flag clicked
+forever
+    change x by (1)
+    change [counter v] by (1)
+    add (x position) to [trail v]
+    if ((counter) > (100))
+        delete (1) of [trail v]
+    end
+end"""
+
+
+COUNTER_SCRIPT = """when green flag clicked
+set [counter v] to [0]
+forever
+    repeat (50)
+        change [counter v] by (item (1) of [steps v])
+        set [total v] to ((counter) + (item (2) of [steps v]))
+        if ((total) > [1000])
+            set [counter v] to [0]
+        end
+    end
+end"""
+
+
+def nested_script(depth):
+    """Return the text of a script with loops nested depth deep."""
+    lines = ["when green flag clicked"]
+    for i in range(depth):
+        lines.append("    " * i + "repeat (10)")
+    lines.append("    " * depth + "change x by (1)")
+    for i in reversed(range(depth)):
+        lines.append("    " * i + "end")
+    return "\n".join(lines)
+
+
+def make_project(sprites=200):
+    """Return a project with lots of busy sprites."""
+    project = kurt.Project()
+    for i in range(sprites):
+        sprite = kurt.Sprite(project, "Sprite%i" % (i + 1))
+        sprite.costume = kurt.Costume("square",
+                                      kurt.Image.new((60, 60), (0, 0, 0)))
+        sprite.variables["counter"] = kurt.Variable(0)
+        sprite.lists["trail"] = kurt.List()
+        sprite.parse(SPRITE_SCRIPT)
+        project.sprites.append(sprite)
+    project.convert("scratch14")
+    return project
+
+
+def draw_costume(size, shapes=60):
+    """Return an image of coloured blobs on a transparent background.
+
+    Unlike a solid colour, it's made of many short runs of pixels, like a
+    drawn costume, so it's as slow to decompress.
+
+    """
+    image = PIL.Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = PIL.ImageDraw.Draw(image)
+    (width, height) = size
+    for i in range(shapes):
+        (x, y) = (random.randint(0, width), random.randint(0, height))
+        r = random.randint(3, max(width, height) / 4)
+        color = tuple(random.randint(0, 255) for j in range(3))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+    return kurt.Image(image)
+
+def make_media_project(sprites=100, costumes=5, size=(120, 120)):
+    """Return a project with lots of costumes."""
+    project = make_project(sprites)
+    for sprite in project.sprites:
+        sprite.costumes = []
+        for i in range(costumes):
+            sprite.costumes.append(kurt.Costume("costume%i" % (i + 1),
+                                                draw_costume(size)))
+        sprite.costume = sprite.costumes[0]
+    return project
+
+
+def encode_int(value):
+    if value <= 223:
+        return chr(value)
+    elif value <= 7935:
+        return chr(224 + value // 256) + chr(value % 256)
+    return "\xff" + struct.pack(">I", value)
+
+def compress_bitmap(data):
+    """Run-length encode a string of 32-bit words, the inverse of
+    :meth:`Bitmap.from_byte_array`.
+
+    """
+    words = [data[i:i + 4] for i in range(0, len(data), 4)]
+    n = len(words)
+    out = [encode_int(n)]
+    i = 0
+    while i < n:
+        j = i + 1
+        while j < n and words[j] == words[i]:
+            j += 1
+        if j - i > 1:
+            word = words[i]
+            if word == word[0] * 4:
+                out += [encode_int((j - i) * 4 + 1), word[0]]
+            else:
+                out += [encode_int((j - i) * 4 + 2), word]
+        else:
+            # Up to the next repeated word
+            while j < n and not (j + 1 < n and words[j] == words[j + 1]):
+                j += 1
+            out.append(encode_int((j - i) * 4 + 3))
+            out += words[i:j]
+        i = j
+    return "".join(out)
+
+
+class CompressingSerializer(kurt.scratch14.Serializer):
+    """Saves bitmaps run-length encoded, as Scratch does. kurt saves them
+    raw, so its files skip the decompression which makes real projects slow
+    to load.
+
+    """
+
+    def save_image(self, kurt_costume):
+        v14_image = kurt.scratch14.Serializer.save_image(self, kurt_costume)
+        if v14_image and v14_image.form:
+            form = v14_image.form
+            form.bits = ByteArray(compress_bitmap(form.bits.value))
+        return v14_image
+
+
+def save_like_scratch(project, path):
+    """Save a Scratch 1.4 project with compressed bitmaps.
+
+    :returns: path to the saved file.
+
+    """
+    plugin = kurt.plugin.Kurt.get_plugin("scratch14")
+    plugin.serializer_cls = CompressingSerializer
+    try:
+        return project.save(path)
+    finally:
+        del plugin.serializer_cls # back to the class's
+
+
+def process_memory():
+    """Return the resident memory of this process in bytes, or None if it
+    can't be found (it's read from /proc).
+
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (IOError, OSError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def time_it(f, repeat):
+    """Return the best time in seconds for calling f()."""
+    best = None
+    for i in range(repeat):
+        start_time = time.time()
+        f()
+        taken = time.time() - start_time
+        if best is None or taken < best:
+            best = taken
+    return best
+
+
+def report(name, seconds, per=None):
+    line = "%-24s %9.3fms" % (name, seconds * 1000)
+    if per:
+        line += "  (%.1fus each)" % (seconds * 1e6 / per)
+    print line
+
+
+def run_frames(interpreter, frames):
+    for i in range(frames):
+        for event in interpreter.tick([]):
+            pass
+
+
+
+#-- Benchmarks --#
+
+def bench_snapshot(project, frames=20, repeat=10):
+    screen = skip.Screen()
+    screen.set_project(project)
+    interpreter = screen.interpreter
+    interpreter.start()
+    run_frames(interpreter, frames)
+
+    scriptables = len(project.sprites) + 1
+    snapshot = interpreter.snapshot()
+    report("snapshot", time_it(interpreter.snapshot, repeat), scriptables)
+    report("snapshot dumps", time_it(snapshot.dumps, repeat), scriptables)
+    data = snapshot.dumps()
+    report("snapshot loads", time_it(lambda: skip.Snapshot.loads(data),
+                                     repeat), scriptables)
+    report("restore", time_it(lambda: interpreter.restore(snapshot), repeat),
+           scriptables)
+    print "  %i bytes, %i threads" % (len(data),
+                                      len(snapshot.state['threads']))
+
+
+def bench_engines(project, frames=200, depth=20):
+    """Time per frame for deeply nested loops, for each engine."""
+    for sprite in project.sprites:
+        sprite.parse(nested_script(depth))
+    for engine in skip.Interpreter.ENGINES:
+        screen = skip.Screen()
+        screen.engine = engine
+        screen.set_project(project)
+        interpreter = screen.interpreter
+        interpreter.start()
+        run_frames(interpreter, 1)
+        taken = time_it(lambda: run_frames(interpreter, frames), 1)
+        report(engine, taken / frames, len(interpreter.threads))
+
+
+def bench_layers(project, moves=10000):
+    """Time to reorder layers, with many particle sprites."""
+    sprites = project.sprites
+    while len(sprites) < 5000:
+        sprites.append(kurt.Sprite(project, "Particle%i" % len(sprites)))
+    project.actors[:] = sprites
+    screen = skip.Screen()
+    screen.set_project(project)
+
+    order = [random.choice(sprites) for i in range(moves)]
+    def go_to_front():
+        for sprite in order:
+            skip.go_to_front(sprite)
+    def go_back_by():
+        for sprite in order:
+            skip.go_back_by(sprite, 10)
+    report("go to front", time_it(go_to_front, 3), moves)
+    report("go back layers", time_it(go_back_by, 3), moves)
+
+
+def bench_counters(project, frames=100):
+    """Time per frame for loops doing arithmetic on variables and list items
+    which hold strings -- as they do when read from a file or "answer".
+
+    """
+    script = None
+    for sprite in project.sprites:
+        sprite.variables["total"] = kurt.Variable(0)
+        sprite.lists["steps"] = kurt.List([u"1", u"2.5"])
+        if not script:
+            script = kurt.text.parse(COUNTER_SCRIPT, sprite)
+        sprite.scripts = [script.copy()]
+    for engine in skip.Interpreter.ENGINES:
+        screen = skip.Screen()
+        screen.engine = engine
+        screen.set_project(project)
+        interpreter = screen.interpreter
+        interpreter.start()
+        run_frames(interpreter, 1)
+        taken = time_it(lambda: run_frames(interpreter, frames), 1)
+        report(engine, taken / frames, len(interpreter.threads))
+
+
+def sizeof(obj, seen):
+    """Return the size in bytes of obj and the runtime state it owns.
+
+    Follows containers, generators and objects from skip, but not the
+    interpreter, the compiled code, or kurt's objects -- those are shared.
+    Anything in seen isn't counted again.
+
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for (key, value) in obj.items():
+            size += sizeof(key, seen) + sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += sizeof(item, seen)
+    elif inspect.isgenerator(obj):
+        if obj.gi_frame:
+            size += sys.getsizeof(obj.gi_frame)
+            for value in obj.gi_frame.f_locals.values():
+                size += sizeof(value, seen)
+    elif type(obj).__module__.startswith("skip") and not isinstance(obj,
+            (skip.Interpreter, skip.vm.Code)):
+        for name in getattr(type(obj), '__slots__', ()):
+            size += sizeof(getattr(obj, name, None), seen)
+        if hasattr(obj, '__dict__'):
+            size += sizeof(obj.__dict__, seen)
+    return size
+
+
+def bench_memory(project, frames=5):
+    """Bytes of runtime state per sprite and per thread."""
+    sprites = project.sprites
+    while len(sprites) < 1000:
+        sprites.append(kurt.Sprite(project, "Clone%i" % len(sprites)))
+    shared = set(id(v) for v in vars(skip).values())
+    before = dict((s, (set(vars(s)), sys.getsizeof(vars(s))))
+                  for s in sprites)
+
+    for engine in skip.Interpreter.ENGINES:
+        screen = skip.Screen()
+        screen.engine = engine
+        screen.set_project(project)
+        interpreter = screen.interpreter
+        interpreter.start()
+        run_frames(interpreter, frames)
+
+        seen = set(shared)
+        total = 0
+        for sprite in sprites:
+            attributes = vars(sprite)
+            (names, dict_size) = before[sprite]
+            total += sys.getsizeof(attributes) - dict_size
+            for (name, value) in attributes.items():
+                if name not in names:
+                    total += sizeof(value, seen)
+        print "%-24s %9i bytes per sprite" % (engine + " sprite",
+                                              total // len(sprites))
+
+        seen = set(shared)
+        threads = interpreter.threads.values()
+        total = sum(sizeof(thread, seen) for thread in threads)
+        print "%-24s %9i bytes per thread" % (engine + " thread",
+                                              total // max(1, len(threads)))
+
+
+def bench_startup(project):
+    """Time from loading the file to the first frame."""
+    folder = None
+    path = project.path
+    if not path or not path.endswith(".sb"):
+        project = make_media_project()
+        folder = tempfile.mkdtemp()
+        path = save_like_scratch(project, os.path.join(folder, "bench.sb"))
+
+    try:
+        from skip.pygame_screen import PygameScreen
+    except ImportError:
+        PygameScreen = None
+    else:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    for (name, load) in (("eager", kurt.Project.load),
+                         ("lazy", skip.lazy.load)):
+        start_time = time.time()
+        project = load(path)
+        report(name + " load", time.time() - start_time)
+        if PygameScreen:
+            screen = PygameScreen()
+            screen.set_project(project)
+            screen.tick()
+            report(name + " first frame", time.time() - start_time)
+
+    if folder:
+        shutil.rmtree(folder)
+
+
+def bench_assets(project, screens=10):
+    """Costume surfaces held by several screens, each running its own copy
+    of a project.
+
+    """
+    try:
+        from skip.pygame_screen import PygameScreen
+        import skip.assets
+        import skip.audio
+    except ImportError:
+        print "needs pygame"
+        return
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    folder = tempfile.mkdtemp()
+    path = save_like_scratch(make_media_project(20),
+                             os.path.join(folder, "bench.sb"))
+
+    running = []
+    memory = [process_memory()]
+    for i in range(screens):
+        screen = PygameScreen(audio_sink=skip.audio.NullSink())
+        screen.set_project(skip.lazy.load(path))
+        screen.tick()
+        running.append(screen)
+        memory.append(process_memory())
+
+    store = skip.assets.store
+    pixels = sum(a.surface.get_width() * a.surface.get_height()
+                 for a in store.assets.values())
+    used = sum(len(screen.assets) for screen in running)
+    print "%-24s %9i" % ("costumes used", used)
+    print "%-24s %9i" % ("costumes decoded", len(store))
+    print "%-24s %9i KB" % ("surface memory", pixels * 4 // 1024)
+    if memory[0] is not None:
+        print "%-24s %9i KB" % ("first screen",
+                                (memory[1] - memory[0]) // 1024)
+        print "%-24s %9i KB" % ("each other screen",
+                (memory[-1] - memory[1]) // max(1, screens - 1) // 1024)
+
+    for screen in running:
+        screen.release_assets()
+    shutil.rmtree(folder)
+
+
+BENCHMARKS = [
+    bench_snapshot,
+    bench_engines,
+    bench_layers,
+    bench_counters,
+    bench_memory,
+    bench_assets,
+    bench_startup,
+]
+
+
+def main():
+    if len(sys.argv) == 2:
+        load = lambda: kurt.Project.load(sys.argv[1])
+    else:
+        load = make_project
+
+    for benchmark in BENCHMARKS:
+        print "--", benchmark.__name__
+        benchmark(load())
+
+
+
+if __name__ == "__main__":
+    main()
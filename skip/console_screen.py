@@ -19,6 +19,7 @@ import signal
 import sys
 
 import skip
+import skip.lazy
 import kurt
 
 
@@ -43,7 +44,7 @@ class ConsoleScreen(skip.Screen):
 if __name__ == "__main__":
     project = None
     if len(sys.argv) == 2:
-        project = kurt.Project.load(sys.argv[1])
+        project = skip.lazy.load(sys.argv[1])
 
     def signal_handler(signal, frame):
         sys.exit(0)
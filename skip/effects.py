@@ -0,0 +1,223 @@
+"""Graphic effects for the Pygame screen, rendered with NumPy.
+
+Effects are applied to the costume before it's rotated and scaled, and the
+result is cached per costume and effect values, so a sprite only costs a
+normal blit until its effects change.
+
+Ghost is applied to the per-pixel alpha of the result, so effected surfaces
+can be blitted straight onto the stage.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import math
+import threading
+
+import numpy
+import pygame
+import pygame.surfarray
+
+
+
+# Order effects are applied in: distortions first, then colour, then alpha.
+EFFECTS = ('fisheye', 'whirl', 'pixelate', 'mosaic', 'color', 'brightness',
+           'ghost')
+
+# Scratch gives greys a hue when the color effect is used.
+MIN_SATURATION = 0.09
+MIN_BRIGHTNESS = 0.055
+
+
+def effects_key(graphic_effects):
+    """Return a hashable key for the effects that are set, or None."""
+    key = tuple((name, graphic_effects[name]) for name in EFFECTS
+                if graphic_effects.get(name))
+    return key or None
+
+
+class EffectsCache(object):
+    """Effected surfaces by (image, effect values).
+
+    When more than ``max_size`` surfaces are cached, the cache is emptied --
+    effects which are being animated each frame will never hit it anyway.
+
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = {}
+        self.lock = threading.Lock() # used by the renderer and stamps
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "<EffectsCache(%i surfaces, %i hits, %i misses)>" % (
+                len(self.surfaces), self.hits, self.misses)
+
+    def get(self, image, surface, graphic_effects):
+        """Return the costume surface with effects applied.
+
+        :param image:   the costume's :class:`kurt.Image`.
+        :param surface: its unaffected Surface.
+
+        """
+        key = effects_key(graphic_effects)
+        if key is None:
+            return surface
+        with self.lock:
+            try:
+                result = self.surfaces[image, key]
+                self.hits += 1
+                return result
+            except KeyError:
+                self.misses += 1
+            if len(self.surfaces) >= self.max_size:
+                self.surfaces.clear()
+            result = self.surfaces[image, key] = apply_effects(surface, key)
+            return result
+
+    def clear(self):
+        with self.lock:
+            self.surfaces.clear()
+
+
+
+#-- Rendering --#
+
+def apply_effects(surface, effects):
+    """Return a new surface with a list of ``(effect, value)`` applied."""
+    rgb = pygame.surfarray.array3d(surface)
+    alpha = pygame.surfarray.array_alpha(surface)
+    for (name, value) in effects:
+        (rgb, alpha) = RENDERERS[name](rgb, alpha, value)
+
+    result = pygame.Surface(surface.get_size(), pygame.SRCALPHA, 32)
+    pygame.surfarray.blit_array(result, rgb)
+    result_alpha = pygame.surfarray.pixels_alpha(result)
+    result_alpha[...] = alpha
+    del result_alpha # unlock the surface
+    return result
+
+def grid(rgb):
+    """Return the coordinates of pixel centres, scaled to 0..1."""
+    (w, h) = rgb.shape[:2]
+    u = (numpy.arange(w) + 0.5) / w
+    v = (numpy.arange(h) + 0.5) / h
+    return numpy.meshgrid(u, v, indexing='ij')
+
+def sample(rgb, alpha, u, v):
+    """Look up the pixels at ``(u, v)``, transparent outside the image."""
+    (w, h) = rgb.shape[:2]
+    x = numpy.floor(u * w).astype(int)
+    y = numpy.floor(v * h).astype(int)
+    inside = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+    x = numpy.clip(x, 0, w - 1)
+    y = numpy.clip(y, 0, h - 1)
+    return (rgb[x, y], alpha[x, y] * inside)
+
+def fisheye(rgb, alpha, value):
+    scale = max(0, (value + 100) / 100.0)
+    (u, v) = grid(rgb)
+    dx = 2 * u - 1
+    dy = 2 * v - 1
+    length = numpy.hypot(dx, dy)
+    r = numpy.minimum(length, 1) ** scale * numpy.maximum(1, length)
+    factor = r / numpy.where(length == 0, 1, length) * 0.5
+    return sample(rgb, alpha, 0.5 + dx * factor, 0.5 + dy * factor)
+
+def whirl(rgb, alpha, value):
+    radians = math.radians(-value)
+    (u, v) = grid(rgb)
+    dx = u - 0.5
+    dy = v - 0.5
+    factor = numpy.maximum(1 - numpy.hypot(dx, dy) / 0.5, 0)
+    angle = radians * factor * factor
+    (sin, cos) = (numpy.sin(angle), numpy.cos(angle))
+    return sample(rgb, alpha, 0.5 + cos * dx - sin * dy,
+                              0.5 + sin * dx + cos * dy)
+
+def pixelate(rgb, alpha, value):
+    size = abs(value) / 10.0
+    if size <= 1:
+        return (rgb, alpha)
+    (w, h) = rgb.shape[:2]
+    x = ((numpy.arange(w) // size + 0.5) * size).astype(int)
+    y = ((numpy.arange(h) // size + 0.5) * size).astype(int)
+    (x, y) = numpy.meshgrid(numpy.minimum(x, w - 1), numpy.minimum(y, h - 1),
+                            indexing='ij')
+    return (rgb[x, y], alpha[x, y])
+
+def mosaic(rgb, alpha, value):
+    count = int(min(max(round((abs(value) + 10) / 10.0), 1), 512))
+    if count == 1:
+        return (rgb, alpha)
+    (u, v) = grid(rgb)
+    return sample(rgb, alpha, (u * count) % 1, (v * count) % 1)
+
+def color(rgb, alpha, value):
+    shift = (value / 200.0) % 1
+    (h, s, v) = rgb_to_hsv(rgb / 255.0)
+    dark = v < MIN_BRIGHTNESS
+    h = numpy.where(dark, 0, h)
+    s = numpy.where(dark, 1, numpy.maximum(s, MIN_SATURATION))
+    v = numpy.maximum(v, MIN_BRIGHTNESS)
+    rgb = hsv_to_rgb((h + shift) % 1, s, v)
+    return ((rgb * 255).round().astype(numpy.uint8), alpha)
+
+def brightness(rgb, alpha, value):
+    value = max(-100, min(value, 100))
+    rgb = numpy.clip(rgb + value * 2.55, 0, 255)
+    return (rgb.astype(numpy.uint8), alpha)
+
+def ghost(rgb, alpha, value):
+    opacity = 1 - max(0, min(abs(value), 100)) / 100.0
+    return (rgb, (alpha * opacity).astype(numpy.uint8))
+
+RENDERERS = {
+    'fisheye': fisheye,
+    'whirl': whirl,
+    'pixelate': pixelate,
+    'mosaic': mosaic,
+    'color': color,
+    'brightness': brightness,
+    'ghost': ghost,
+}
+
+def rgb_to_hsv(rgb):
+    """Vectorised :func:`colorsys.rgb_to_hsv`."""
+    (r, g, b) = (rgb[..., 0], rgb[..., 1], rgb[..., 2])
+    v = rgb.max(axis=-1)
+    delta = v - rgb.min(axis=-1)
+    s = numpy.where(v == 0, 0, delta / numpy.where(v == 0, 1, v))
+    d = numpy.where(delta == 0, 1, delta)
+    h = numpy.where(v == r, (g - b) / d,
+        numpy.where(v == g, 2 + (b - r) / d, 4 + (r - g) / d))
+    h = numpy.where(delta == 0, 0, (h / 6.0) % 1)
+    return (h, s, v)
+
+def hsv_to_rgb(h, s, v):
+    """Vectorised :func:`colorsys.hsv_to_rgb`."""
+    i = numpy.floor(h * 6)
+    f = h * 6 - i
+    p = v * (1 - s)
+    q = v * (1 - s * f)
+    t = v * (1 - s * (1 - f))
+    i = i.astype(int) % 6
+    r = numpy.choose(i, [v, q, p, p, t, v])
+    g = numpy.choose(i, [t, v, v, q, p, p])
+    b = numpy.choose(i, [p, p, t, v, v, q])
+    return numpy.dstack((r, g, b))
@@ -0,0 +1,182 @@
+"""The drawing order of sprites.
+
+:class:`Layers` keeps sprites in an implicit treap -- a balanced tree ordered
+by position rather than by key -- so moving a sprite to another layer takes
+O(log n) time instead of the O(n) of removing it from and inserting it into
+``project.actors``.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import random
+
+
+
+class Node(object):
+    __slots__ = ('item', 'priority', 'left', 'right', 'parent', 'size')
+
+    def __init__(self, item, priority):
+        self.item = item
+        self.priority = priority
+        self.left = None
+        self.right = None
+        self.parent = None
+        self.size = 1
+
+
+def size(node):
+    return node.size if node else 0
+
+def update(node):
+    node.size = 1
+    if node.left:
+        node.size += node.left.size
+        node.left.parent = node
+    if node.right:
+        node.size += node.right.size
+        node.right.parent = node
+    return node
+
+def merge(a, b):
+    """Return the tree with the nodes of a followed by those of b."""
+    if not a:
+        return b
+    if not b:
+        return a
+    if a.priority > b.priority:
+        a.right = merge(a.right, b)
+        return update(a)
+    else:
+        b.left = merge(a, b.left)
+        return update(b)
+
+def split(node, count):
+    """Return two trees: the first count nodes, and the rest."""
+    if not node:
+        return (None, None)
+    if size(node.left) < count:
+        (left, right) = split(node.right, count - size(node.left) - 1)
+        node.right = left
+        if right:
+            right.parent = None
+        return (update(node), right)
+    else:
+        (left, right) = split(node.left, count)
+        node.left = right
+        if left:
+            left.parent = None
+        return (left, update(node))
+
+
+class Layers(object):
+    """Sprites in drawing order, back to front.
+
+    :meth:`visible` is cached until the order changes or
+    :meth:`invalidate` is called, eg. when a sprite is shown or hidden.
+
+    """
+
+    def __init__(self, sprites=()):
+        self.random = random.Random(0) # leave the global one for scripts
+        self.nodes = {}
+        self.root = None
+        for sprite in sprites:
+            self.root = merge(self.root, self.make_node(sprite))
+        self.invalidate()
+
+    def __repr__(self):
+        return "<Layers(%i sprites)>" % len(self)
+
+    def __len__(self):
+        return size(self.root)
+
+    def __contains__(self, sprite):
+        return sprite in self.nodes
+
+    def __iter__(self):
+        return iter(self.order())
+
+    def make_node(self, sprite):
+        node = self.nodes[sprite] = Node(sprite, self.random.random())
+        return node
+
+    def invalidate(self):
+        self._order = None
+        self._visible = None
+
+    def order(self):
+        """Return a list of the sprites, back to front."""
+        if self._order is None:
+            order = []
+            stack = []
+            node = self.root
+            while stack or node:
+                if node:
+                    stack.append(node)
+                    node = node.left
+                else:
+                    node = stack.pop()
+                    order.append(node.item)
+                    node = node.right
+            self._order = order
+        return self._order
+
+    def visible(self):
+        """Return a list of the visible sprites, back to front."""
+        if self._visible is None:
+            self._visible = [s for s in self.order() if s.is_visible]
+        return self._visible
+
+    def index(self, sprite):
+        """Return the layer of a sprite, counting from the back."""
+        node = self.nodes[sprite]
+        index = size(node.left)
+        while node.parent:
+            if node is node.parent.right:
+                index += size(node.parent.left) + 1
+            node = node.parent
+        return index
+
+    def remove(self, sprite):
+        index = self.index(sprite)
+        (before, rest) = split(self.root, index)
+        (node, after) = split(rest, 1)
+        del self.nodes[sprite]
+        self.root = merge(before, after)
+        if self.root:
+            self.root.parent = None
+        self.invalidate()
+
+    def insert(self, index, sprite):
+        (before, after) = split(self.root, max(0, index))
+        self.root = merge(merge(before, self.make_node(sprite)), after)
+        self.root.parent = None
+        self.invalidate()
+
+    def append(self, sprite):
+        self.insert(len(self), sprite)
+
+    # Blocks
+
+    def go_to_front(self, sprite):
+        self.remove(sprite)
+        self.append(sprite)
+
+    def go_back_by(self, sprite, n):
+        index = self.index(sprite)
+        self.remove(sprite)
+        self.insert(index - int(n), sprite)
@@ -0,0 +1,225 @@
+"""Lazy loading of Scratch projects.
+
+Loading a Scratch 1.4 project with :meth:`kurt.Project.load` decodes every
+costume bitmap and builds a wave file for every sound up-front. With
+:func:`load`, the project's structure and scripts are available straight
+away, and image and sound data is only decoded when something first uses it.
+
+Other formats are already lazy -- kurt keeps their media as raw file
+contents until it's needed -- so they are loaded as usual.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import os
+
+import kurt
+import kurt.plugin
+import kurt.scratch14
+from kurt.scratch14.fixed_objects import Bitmap, Form
+
+
+
+class LazyImage(kurt.Image):
+    """An Image which is decoded on first access of :attr:`pil_image`.
+
+    :param decode: function returning a :class:`PIL.Image.Image`.
+    :param size:   ``(width, height)``, so the size is known without decoding.
+    :param source: strings holding the undecoded data, so the image can be
+                   hashed without decoding it.
+
+    """
+
+    def __init__(self, decode, size, source=()):
+        kurt.Image.__init__(self, None)
+        self._decode = decode
+        self._size = tuple(size)
+        self.source = tuple(source)
+
+    @property
+    def is_decoded(self):
+        return self._decode is None
+
+    def decode(self):
+        """Return the :class:`PIL.Image.Image`, without keeping it if it
+        hasn't been decoded already.
+
+        """
+        if self._decode:
+            return self._decode()
+        return self._pil_image
+
+    @property
+    def pil_image(self):
+        if self._decode:
+            self._pil_image = self._decode()
+            self._decode = None
+        return kurt.Image.pil_image.fget(self)
+
+    @property
+    def format(self):
+        # kurt asks the decoded image, which has none; converting the project
+        # checks every costume's format, so don't decode just to find that.
+        if self._decode:
+            return None
+        return kurt.Image.format.fget(self)
+
+    @property
+    def contents(self):
+        self.pil_image
+        return kurt.Image.contents.fget(self)
+
+
+class LazyWaveform(kurt.Waveform):
+    """A Waveform whose wave file is built on first access of :attr:`contents`.
+
+    :param decode: function returning the raw wave file contents.
+
+    """
+
+    def __init__(self, decode, rate, sample_count):
+        kurt.Waveform.__init__(self, None, rate, sample_count)
+        self._decode = decode
+
+    @property
+    def is_decoded(self):
+        return self._decode is None
+
+    @property
+    def contents(self):
+        if self._decode:
+            self._contents = self._decode()
+            self._decode = None
+        return kurt.Waveform.contents.fget(self)
+
+
+def decode_form(form):
+    if not isinstance(form.bits, Bitmap):
+        form = form.copy() # so the original keeps only the compressed bits
+        Form.built(form)
+    return form.to_array()
+
+def form_source(form):
+    return (repr((form.width, form.height, form.depth, form.colors)),
+            form.bits.value)
+
+def not_built():
+    pass
+
+def decode_obj_table(table_entries, plugin):
+    """Like kurt's, but without building Forms. Each one gets a ``built``
+    attribute hiding the method while it's decoded, so loads on other threads
+    are unaffected.
+
+    """
+    forms = [entry for entry in table_entries if isinstance(entry, Form)]
+    for form in forms:
+        form.built = not_built
+    try:
+        return kurt.scratch14.decode_obj_table(table_entries, plugin)
+    finally:
+        for form in forms:
+            del form.built
+
+
+class LazySerializer(kurt.scratch14.Serializer):
+    """Loads Scratch 1.4 projects without decoding their media.
+
+    Most of the time is spent decompressing bitmaps, which kurt does for
+    every Form as soon as the file is parsed, so that's put off too.
+
+    """
+
+    def load(self, fp):
+        # As kurt.scratch14.Serializer.load, with lazy decode_obj_table
+        self.project = kurt.Project()
+
+        v14_project = kurt.scratch14.scratch_file.parse_stream(fp)
+        self.info = decode_obj_table(v14_project.info, self.plugin)
+        self.stage = decode_obj_table(v14_project.stage, self.plugin)
+
+        self.project.notes = self.info.get('comment', '')
+        self.project.author = self.info.get('author', '')
+
+        thumbnail = self.info['thumbnail']
+        if thumbnail and isinstance(thumbnail, Form):
+            thumbnail = self.UserObject('ImageMedia',
+                name = 'thumbnail',
+                form = thumbnail,
+            )
+        thumbnail_costume = self.load_image(thumbnail)
+        if thumbnail_costume:
+            self.project.thumbnail = thumbnail_costume.image
+
+        self.load_scriptable(self.project.stage, self.stage)
+        self.load_lists(self.stage.lists, self.project)
+
+        self.project.variables = self.project.stage.variables
+        self.project.stage.variables = {}
+
+        for v14_sprite in self.stage.sprites:
+            kurt_sprite = kurt.Sprite(self.project, v14_sprite.name)
+            self.load_scriptable(kurt_sprite, v14_sprite)
+            self.load_lists(v14_sprite.lists, kurt_sprite)
+            self.project.sprites.append(kurt_sprite)
+
+        for v14_morph in self.stage.submorphs:
+            if v14_morph.class_name == 'WatcherMorph':
+                self.project.actors.append(self.load_watcher(v14_morph))
+
+        return self.project
+
+    def load_image(self, v14_image):
+        if v14_image and not v14_image.jpegBytes:
+            form = v14_image.compositeForm or v14_image.form
+            image = LazyImage(lambda: decode_form(form),
+                              (form.width, form.height), form_source(form))
+            return kurt.Costume(v14_image.name, image,
+                                v14_image.rotationCenter)
+        return kurt.scratch14.Serializer.load_image(self, v14_image)
+
+    def load_sound(self, v14_sound):
+        serializer = kurt.scratch14.Serializer
+        def decode():
+            sound = serializer.load_sound(self, v14_sound)
+            return sound.waveform.contents
+        original = v14_sound.originalSound
+        waveform = LazyWaveform(decode, original.originalSamplingRate,
+                                original.samplesSize)
+        return kurt.Sound(v14_sound.name, waveform)
+
+
+def load(path):
+    """Load a project from a file path, decoding media lazily.
+
+    Otherwise the same as :meth:`kurt.Project.load`.
+
+    """
+    (folder, filename) = os.path.split(path)
+    (name, extension) = os.path.splitext(filename)
+    plugin = kurt.plugin.Kurt.get_plugin(extension=extension)
+    if not plugin or plugin.name != "scratch14":
+        return kurt.Project.load(path)
+
+    fp = open(path, "rb")
+    project = LazySerializer(plugin).load(fp)
+    fp.close()
+    project.convert(plugin)
+    project.path = path
+    if not project.name:
+        project.name = name
+    return project
@@ -0,0 +1,129 @@
+"""Preparation pass over scripts before they're run.
+
+* Constant folding: reporters registered as ``"pure"`` (see
+  :attr:`skip.Interpreter.KINDS`) whose arguments are all literals are
+  replaced by their value, eg. ``(join [a] [b])`` becomes ``[ab]``.
+
+* Dead branch elimination: an "if" or "if else" whose condition is a literal
+  is replaced by the blocks of the branch that would run.
+
+The project's scripts are left alone: :func:`prepare` returns a new Script,
+sharing any blocks which didn't change.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import kurt
+import skip
+
+
+
+class FoldStats(object):
+    def __init__(self):
+        self.scripts = 0
+        self.folded = 0
+        self.pruned = 0
+
+    def __repr__(self):
+        return "<FoldStats(%i scripts, %i folded, %i pruned)>" % (
+                self.scripts, self.folded, self.pruned)
+
+    def report(self):
+        return ("%i scripts prepared: %i reporters folded, "
+                "%i branches pruned" % (self.scripts, self.folded,
+                                        self.pruned))
+
+
+class Optimizer(object):
+    def __init__(self, interpreter, stats):
+        self.interpreter = interpreter
+        self.stats = stats
+
+    def prepare(self, script):
+        self.stats.scripts += 1
+        blocks = self.fold_blocks(script.blocks)
+        if blocks == script.blocks:
+            return script
+        return kurt.Script(blocks, script.pos)
+
+    def fold_blocks(self, blocks):
+        """Return a new list of stack blocks."""
+        result = []
+        for block in blocks:
+            block = self.fold(block)
+            branch = self.prune(block)
+            if branch is None:
+                result.append(block)
+            else:
+                result += branch
+        return result
+
+    def fold(self, value):
+        """Return the value with constant reporters folded."""
+        if isinstance(value, list):
+            return self.fold_blocks(value)
+        elif not isinstance(value, kurt.Block):
+            return value
+
+        try:
+            (block, f) = self.interpreter.resolve(value)
+        except kurt.BlockNotSupported:
+            return value # raise it when the block is run
+
+        args = [self.fold(arg) for arg in block.args]
+        if all(a is b for (a, b) in zip(args, block.args)):
+            args = block.args
+        else:
+            block = kurt.Block(block.type, *args)
+
+        if (self.interpreter.KINDS.get(block.type) == "pure" and
+                not any(isinstance(arg, (kurt.Block, list)) for arg in args)):
+            try:
+                value = self.interpreter.evaluate(None, block)
+            except Exception:
+                return block # raise it when the block is run
+            self.stats.folded += 1
+            return value
+        return block
+
+    def prune(self, block):
+        """Return the blocks to replace a statically decidable "if" with, or
+        None to keep the block.
+
+        """
+        if not isinstance(block, kurt.Block):
+            return None
+        f = self.interpreter.COMMANDS.get(block.type)
+        if f not in (skip.if_, skip.if_else):
+            return None
+
+        condition = block.args[0]
+        if isinstance(condition, kurt.Block):
+            return None
+        insert = block.type.inserts[0]
+        condition = self.interpreter.evaluate(None, condition, insert)
+
+        self.stats.pruned += 1
+        if f == skip.if_:
+            return block.args[1] or [] if condition else []
+        else:
+            return (block.args[1] if condition else block.args[2]) or []
+
+
+def prepare(interpreter, script, stats):
+    """Return the script with constants folded and dead branches removed."""
+    return Optimizer(interpreter, stats).prepare(script)
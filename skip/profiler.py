@@ -0,0 +1,154 @@
+"""A sampling profiler which reports time by Scratch script and block.
+
+cProfile only shows time spent in the interpreter's own functions. Instead,
+a :class:`Profiler` is interrupted every few milliseconds of CPU time by a
+``SIGPROF`` timer, and looks at the stack to see which script is running and
+which block it's in. Samples are counted by (sprite, script, block), so the
+slow parts of a project stand out::
+
+    $ python skip/pygame_screen.py --profile game.sb
+
+or type ``profile`` at the REPL.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import collections
+import signal
+
+import kurt
+import skip
+import skip.vm
+
+
+
+EVALUATE_CODE = skip.Interpreter.evaluate.__func__.__code__
+RUN_SCRIPT_CODE = skip.Interpreter.run_script.__func__.__code__
+VM_TICK_CODE = skip.vm.VMThread.tick.__func__.__code__
+
+
+def block_path(frame):
+    """Return the blocks being run in a stack of frames, outermost first."""
+    path = []
+    while frame:
+        code = frame.f_code
+        block = None
+        if code is EVALUATE_CODE:
+            block = frame.f_locals.get('value')
+        elif code is RUN_SCRIPT_CODE:
+            block = frame.f_locals.get('block')
+        elif code is VM_TICK_CODE:
+            thread = frame.f_locals.get('self')
+            if thread is not None and thread.pc < len(thread.code.blocks):
+                block = thread.code.blocks[thread.pc]
+        if isinstance(block, kurt.Block) and not (path and block is path[-1]):
+            path.append(block)
+        frame = frame.f_back
+    path.reverse()
+    return path
+
+def snippet(block, width=60):
+    text = block.stringify().split("\n")[0]
+    if len(text) > width:
+        text = text[:width - 3] + "..."
+    return text
+
+
+class Profiler(object):
+    """Samples what an interpreter is doing.
+
+    Signal handlers run on the main thread, so the interpreter must be
+    ticked there. Unix only.
+
+    """
+
+    def __init__(self, interpreter, interval=0.005):
+        self.interpreter = interpreter
+        self.interval = interval
+        self.running = False
+
+        self.samples = 0
+        self.idle = 0
+        self.by_script = collections.Counter() # (scriptable, script)
+        self.by_block = collections.Counter() # (scriptable, script, block)
+
+    def __repr__(self):
+        return "<Profiler(%i samples)>" % self.samples
+
+    def start(self):
+        signal.signal(signal.SIGPROF, self.handle_signal)
+        signal.siginterrupt(signal.SIGPROF, False)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self.running = True
+
+    def stop(self):
+        if self.running:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+            self.running = False
+
+    def handle_signal(self, signum, frame):
+        self.sample(frame)
+
+    def sample(self, frame):
+        running = self.interpreter.running_thread
+        self.samples += 1
+        if running is None:
+            self.idle += 1
+            return
+        (script, thread) = running
+        key = (thread.scriptable, script)
+        self.by_script[key] += 1
+        path = block_path(frame)
+        if path:
+            self.by_block[key + (path[-1],)] += 1
+
+    # Reporting
+
+    def script_name(self, scriptable, script):
+        try:
+            index = scriptable.scripts.index(script) + 1
+        except ValueError:
+            index = 0
+        return "%s script #%i" % (scriptable.name, index)
+
+    def report(self, limit=10):
+        if not self.samples:
+            return "no samples"
+        total = float(self.samples)
+        lines = ["%i samples every %.1fms, %.1f%% running scripts" % (
+                self.samples, self.interval * 1000,
+                (self.samples - self.idle) / total * 100)]
+
+        lines.append("")
+        lines.append("Scripts:")
+        for ((scriptable, script), count) in self.by_script.most_common(
+                limit):
+            lines.append("  %5.1f%%  %-24s %s" % (count / total * 100,
+                    self.script_name(scriptable, script),
+                    snippet(script.blocks[0])))
+
+        lines.append("")
+        lines.append("Blocks:")
+        for ((scriptable, script, block), count) in self.by_block.most_common(
+                limit):
+            lines.append("  %5.1f%%  %-24s %s" % (count / total * 100,
+                    self.script_name(scriptable, script), snippet(block)))
+
+        lines.append("")
+        lines.append(self.interpreter.fold_stats.report())
+        return "\n".join(lines)
@@ -17,30 +17,31 @@
 
 import select
 import signal
-import sys
+import argparse
+import atexit
+import collections
+import os
+import random
+import threading
+import time
 
 import pygame
 
 import kurt
 import skip
+import skip.assets
+import skip.audio
+import skip.effects
+import skip.lazy
+import skip.text
 from skip import Rect, ScreenEvent
 
 
-# TODO text: say, ask, variable/list watchers
-# TODO sound
+# TODO text: ask
 
+(STAGE_WIDTH, STAGE_HEIGHT) = kurt.Stage.SIZE
 
 
-def blit_alpha(dest, source, pos, opacity):
-    """Hack: blit per-pixel alpha source onto dest with surface opacity."""
-    # http://www.nerdparadise.com/tech/python/pygame/blitopacity/
-    (x, y) = pos
-    temp = pygame.Surface((source.get_width(),
-                           source.get_height())).convert()
-    temp.blit(dest, (-x, -y))
-    temp.blit(source, (0, 0))
-    temp.set_alpha(opacity)
-    dest.blit(temp, pos)
 
 def color_mask(surface, color):
     if isinstance(color, kurt.Color):
@@ -52,21 +53,145 @@ def color_mask(surface, color):
     return color_mask
 
 
+class MaskCache(object):
+    """Collision masks of transformed sprites, by (costume image, direction,
+    size, colour). The least recently used are dropped once it's full.
+
+    """
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self.masks = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return "<MaskCache(%i masks, %i hits, %i misses, %i evictions)>" % (
+                len(self.masks), self.hits, self.misses, self.evictions)
+
+    def __len__(self):
+        return len(self.masks)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    def get(self, key):
+        """Return the mask for key, or None."""
+        mask = self.masks.pop(key, None)
+        if mask is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.masks[key] = mask # most recently used goes last
+        return mask
+
+    def add(self, key, mask):
+        if len(self.masks) >= self.max_size:
+            self.masks.popitem(last=False)
+            self.evictions += 1
+        self.masks[key] = mask
+        return mask
+
+    def clear(self):
+        self.masks.clear()
+
+
+
+class Input(object):
+    """What the screen senses, captured once at the start of each frame, so
+    sensing blocks don't have to ask pygame.
+
+    :attr:`keys` is the set of Scratch key names being held down.
+
+    """
+    __slots__ = ('mouse_pos', 'mouse_down', 'keys')
+
+    def __init__(self, mouse_pos=(0, 0), mouse_down=False, keys=frozenset()):
+        self.mouse_pos = mouse_pos
+        self.mouse_down = mouse_down
+        self.keys = keys
+
+    def __repr__(self):
+        return "<Input(%r, %r, %r)>" % (self.mouse_pos, self.mouse_down,
+                                        sorted(self.keys))
+
+
 
 class PygameScreen(skip.Screen):
     CAPTION = "SKIP"
-    KEYS_BY_NAME = {}
 
-    def __init__(self):
-        self.surface = pygame.display.set_mode(kurt.Stage.SIZE)
+    KEYS_BY_NAME = {}
+    """Pygame key constants by Scratch key name. Filled in once the display
+    is set up, as :func:`pygame.key.name` needs it."""
+
+    NAMES_BY_KEY = {}
+
+    MAX_STEPS = 8
+    """Most interpreter ticks per frame with a fixed timestep. If it falls
+    further behind than this, the project runs slower than real time."""
+
+    effects_cache_size = 256
+    text_cache_size = 1024
+    mask_cache_size = 512
+
+    def __init__(self, threaded=False, audio_sink=None, timestep=None,
+                 fps=40, scale=1, fullscreen=False, smooth=True):
+        """
+        :param threaded: draw frames on a separate thread, from the
+                         :class:`skip.RenderState` of the latest tick, so
+                         slow drawing doesn't hold up the interpreter.
+        :param audio_sink: where sound goes; see :mod:`skip.audio`. Defaults
+                           to the sound device, if there is one.
+        :param timestep: run the interpreter in fixed steps of this many
+                         seconds, as many as have passed each frame, and
+                         draw sprites interpolated between the last two.
+        :param fps: the most frames to draw per second, or 0 for turbo mode:
+                    as many as possible. With a fixed timestep, turbo mode
+                    runs one step per frame, so the project runs faster
+                    than real time.
+        :param scale: size of the window, relative to the stage.
+        :param fullscreen: fill the display instead, keeping the stage's
+                           aspect ratio.
+        :param smooth: filter the stage when scaling it, rather than
+                       making big pixels.
+
+        """
+        if audio_sink is None:
+            audio_sink = (skip.audio.PygameSink.create() or
+                          skip.audio.NullSink())
+        if fullscreen:
+            self.window = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        else:
+            self.window = pygame.display.set_mode((int(STAGE_WIDTH * scale),
+                                                   int(STAGE_HEIGHT * scale)))
+        self.set_viewport(smooth)
         pygame.display.set_caption(self.CAPTION)
         self.clock = pygame.time.Clock()
-
-        for constant in dir(pygame):
-            if constant.startswith("K_"):
-                key = eval("pygame."+constant)
-                name = pygame.key.name(key)
-                self.KEYS_BY_NAME[name] = key
+        self.threaded = threaded
+        self.timestep = timestep
+        self.fps = fps
+        self.renderer = None
+        self.recorder = None
+        self.mixer = skip.audio.Mixer(audio_sink)
+        self.mixer.start()
+        self.pen_lock = threading.RLock()
+        self.input = Input()
+        self.assets = {} # image: skip.assets.Asset
+        self.asset_lock = threading.Lock()
+
+        if not self.KEYS_BY_NAME:
+            for constant in dir(pygame):
+                if constant.startswith("K_"):
+                    key = getattr(pygame, constant)
+                    name = pygame.key.name(key)
+                    if name + " arrow" in skip.KEY_NAMES:
+                        name += " arrow"
+                    if name in skip.KEY_NAMES:
+                        self.KEYS_BY_NAME[name] = key
+                        self.NAMES_BY_KEY[key] = name
 
     def set_project(self, project):
         self.running = True
@@ -74,23 +199,99 @@ class PygameScreen(skip.Screen):
         self.pen_surface = pygame.Surface(kurt.Stage.SIZE).convert_alpha()
         self.clear()
 
-        self.surfaces = {}
-        self.masks = {}
-        self.sounds = {}
+        self.release_assets()
+        self.sprite_masks = MaskCache(self.mask_cache_size)
+        self.effects = skip.effects.EffectsCache(self.effects_cache_size)
+        self.text_cache = skip.text.TextCache(self.text_cache_size)
+        self.bubbles = {}
 
         skip.Screen.set_project(self, project)
+        self.bubble_view = skip.text.Bubbles(self.text_cache)
+        self.watcher_view = skip.text.Watchers(self.text_cache,
+                                               self.interpreter)
+        self.watchers = [a for a in project.actors
+                         if isinstance(a, kurt.Watcher)]
+        self.lag = 0
+        self.last_frame_time = None
+        self.previous_state = None
+        self.pending_events = []
+        if self.timestep:
+            self.interpreter.keep_render_state = True
+            self.interpreter.set_timestep(self.timestep)
+        self.clock_changed() # a new interpreter starts from zero
+        if self.threaded:
+            self.interpreter.keep_render_state = True
+            if not self.renderer:
+                self.renderer = Renderer(self)
+                self.renderer.start()
+                atexit.register(self.renderer.stop) # before pygame quits
         if project.name:
             pygame.display.set_caption(project.name + " : " + self.CAPTION)
         else:
             pygame.display.set_caption(self.CAPTION)
-        for scriptable in [project.stage] + project.sprites:
-            for costume in scriptable.costumes:
-                p_i = costume.image.pil_image
-                assert p_i.mode in ("RGB", "RGBA")
-                surface = pygame.image.fromstring(
-                        p_i.tostring(), p_i.size, p_i.mode).convert_alpha()
-                self.surfaces[costume.image] = surface
-                self.masks[costume.image] = pygame.mask.from_surface(surface)
+
+    def set_viewport(self, smooth=True):
+        """Fit the stage to the middle of the window.
+
+        Everything is drawn at stage resolution, to :attr:`surface`. If the
+        window is a different size, that's a backbuffer which is scaled into
+        the window's :attr:`viewport` each frame -- so costumes and collision
+        masks are cached at the same size however big the window is.
+
+        """
+        (width, height) = self.window.get_size()
+        factor = min(float(width) / STAGE_WIDTH, float(height) / STAGE_HEIGHT)
+        size = (int(STAGE_WIDTH * factor), int(STAGE_HEIGHT * factor))
+        self.viewport = pygame.Rect((0, 0), size)
+        self.viewport.center = (width // 2, height // 2)
+        if size == (width, height) == kurt.Stage.SIZE:
+            self.surface = self.window
+            self.view_surface = None
+        else:
+            self.surface = pygame.Surface(kurt.Stage.SIZE, 0, self.window)
+            if size == (width, height):
+                self.view_surface = self.window
+            else:
+                # smoothscale can't draw into a subsurface
+                self.view_surface = pygame.Surface(size, 0, self.window)
+        self.window.fill((0, 0, 0))
+
+        # smoothscale only works on 24- and 32-bit surfaces
+        if smooth and self.window.get_bitsize() >= 24:
+            self.scale_surface = pygame.transform.smoothscale
+        else:
+            self.scale_surface = pygame.transform.scale
+
+    def get_asset(self, image):
+        """Return the :class:`skip.assets.Asset` for a costume image, from
+        the process-wide store.
+
+        """
+        try:
+            return self.assets[image]
+        except KeyError:
+            pass
+        with self.asset_lock: # the renderer may be drawing it too
+            if image not in self.assets:
+                self.assets[image] = skip.assets.store.acquire(image)
+            return self.assets[image]
+
+    def release_assets(self):
+        """Give back the costume images used so far to the store."""
+        with self.asset_lock:
+            for asset in self.assets.values():
+                skip.assets.store.release(asset)
+            self.assets = {}
+
+    def get_surface(self, image):
+        """Return the Surface for a costume image, decoding it on first use.
+        It's shared, so don't draw onto it.
+
+        """
+        return self.get_asset(image).surface
+
+    def get_mask(self, image):
+        return self.get_asset(image).mask
 
     def handle_events(self):
         for event in pygame.event.get():
@@ -99,10 +300,9 @@ class PygameScreen(skip.Screen):
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.running = False
-                else:
-                    name = pygame.key.name(event.key)
-                    if name in kurt.Insert(None, "key").options():
-                        yield ScreenEvent("key_pressed", name)
+                elif event.key in self.NAMES_BY_KEY:
+                    yield ScreenEvent("key_pressed",
+                                      self.NAMES_BY_KEY[event.key])
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
                     yield ScreenEvent("mouse_down")
@@ -111,51 +311,154 @@ class PygameScreen(skip.Screen):
                     yield ScreenEvent("mouse_up")
 
     def tick(self):
-        self.clock.tick(40)
+        self.clock.tick(self.fps)
 
         events = list(self.handle_events())
+        self.input = self.sense_input()
+        if self.timestep:
+            render_state = self.run_steps(events)
+        else:
+            self.step(events)
+            render_state = (self.interpreter.render_state if self.renderer
+                            else self.interpreter.take_render_state())
+
+        overlays = self.take_overlays()
+        if self.renderer:
+            self.renderer.submit(render_state, overlays)
+        else:
+            self.render(render_state, overlays)
+
+    def step(self, events):
+        """Run one tick of the interpreter."""
+        if self.recorder:
+            self.recorder.record_frame(self, events)
         for event in self.interpreter.tick(events):
             if event.kind == "clear":
                 self.clear()
             elif event.kind == "stamp":
                 self.stamp(event.scriptable)
             elif event.kind in ("say", "think"):
-                print "::", unicode(event)
+                self.say(event.scriptable, event.kind, event.value)
             else:
                 print "::", event
 
-        self.draw_sprite(self.project.stage, self.surface)
-        self.surface.blit(self.pen_surface, (0, 0))
-        for actor in self.project.actors:
-            if isinstance(actor, kurt.Scriptable):
-                if actor.is_visible:
-                    self.draw_sprite(actor, self.surface)
+        if not self.mixer.sink.realtime:
+            self.mixer.render_until(self.interpreter.now())
 
+    def run_steps(self, events):
+        """Run as many fixed timesteps as have passed since the last frame.
+        Returns the :class:`skip.RenderState` to draw.
+
+        """
+        now = time.time()
+        if self.fps and self.last_frame_time is not None:
+            self.lag = min(self.lag + now - self.last_frame_time,
+                           self.MAX_STEPS * self.timestep)
+        else:
+            self.lag = self.timestep # the first frame always runs a step
+        self.last_frame_time = now
+
+        self.pending_events += events
+        while self.lag >= self.timestep:
+            self.previous_state = self.interpreter.render_state
+            self.step(self.pending_events)
+            self.pending_events = [] # only seen by the first step
+            self.lag -= self.timestep
+
+        render_state = self.interpreter.render_state
+        if self.previous_state is None:
+            return render_state
+        return render_state.interpolate(self.previous_state,
+                                        self.lag / self.timestep)
+
+    def take_overlays(self):
+        """Return what's drawn over the sprites -- speech bubbles, and what
+        the watchers show -- so it can be drawn from another thread.
+
+        """
+        watchers = [w for w in self.watchers if w.is_visible]
+        return (tuple(self.bubbles.items()),
+                self.watcher_view.take_state(watchers))
+
+    def render(self, render_state, overlays=None):
+        """Draw a :class:`skip.RenderState` to the window.
+
+        :param overlays: from :meth:`take_overlays`; taken now if not given.
+
+        """
+        if overlays is None:
+            overlays = self.take_overlays()
+        (bubbles, watcher_state) = overlays
+
+        for actor in render_state.actors:
+            self.draw_actor(actor, self.surface)
+            if actor.is_stage:
+                with self.pen_lock:
+                    self.surface.blit(self.pen_surface, (0, 0))
+
+        self.watcher_view.draw(self.surface, watcher_state)
+
+        if bubbles:
+            by_scriptable = dict((a.scriptable, a)
+                                 for a in render_state.actors)
+            for (sprite, (kind, text)) in bubbles:
+                if sprite in by_scriptable:
+                    rect = self.rect_to_screen(
+                            skip.bounds(by_scriptable[sprite]))
+                    self.bubble_view.draw(self.surface, kind, text, rect)
+
+        if self.view_surface:
+            self.scale_surface(self.surface, self.viewport.size,
+                               self.view_surface)
+            if self.view_surface is not self.window:
+                self.window.blit(self.view_surface, self.viewport)
         pygame.display.flip()
 
     def get_sprite_mask(self, sprite, color=None):
-        if (sprite.direction != 0 and sprite.size != 1) or color is not None:
-            surface = self.surfaces[sprite.costume.image]
-            #if sprite.direction != 90 and sprite.size != 100:
+        """Return the collision mask of a sprite as it's drawn.
+
+        :param color: only include pixels of this colour.
+
+        """
+        image = sprite.costume.image
+        if color is None and sprite.direction == 90 and sprite.size == 100:
+            return self.get_mask(image)
+        if isinstance(color, kurt.Color):
+            color = color.value
+        key = (image, sprite.direction, sprite.size, color)
+        mask = self.sprite_masks.get(key)
+        if mask is None:
+            surface = self.get_surface(image)
             angle = -(sprite.direction - 90)
             scale = sprite.size / 100.0
-            surface = pygame.transform.rotozoom(surface, angle, scale)
+            if angle or scale != 1:
+                surface = pygame.transform.rotozoom(surface, angle, scale)
             if color is None:
-                return pygame.mask.from_surface(surface)
+                mask = pygame.mask.from_surface(surface)
             else:
-                return color_mask(surface, color)
-        else:
-            return self.masks[sprite.costume.image]
+                mask = color_mask(surface, color)
+            self.sprite_masks.add(key, mask)
+        return mask
+
+    def cache_report(self):
+        return "\n".join(repr(cache) for cache in (self.effects,
+                self.text_cache, self.sprite_masks, skip.assets.store))
 
     def draw_sprite(self, sprite, onto_surface, offset=None):
-        surface = self.surfaces[sprite.costume.image]
-        if isinstance(sprite, kurt.Stage):
+        self.draw_actor(skip.actor_state(sprite, None), onto_surface, offset)
+
+    def draw_actor(self, actor, onto_surface, offset=None):
+        """Draw an :class:`skip.ActorState`."""
+        image = actor.costume.image
+        surface = self.effects.get(image, self.get_surface(image),
+                                   dict(actor.graphic_effects))
+        if actor.is_stage:
             pos = (0, 0)
         else:
-            pos = self.pos_to_screen(skip.bounds(sprite).topleft)
+            pos = self.pos_to_screen(skip.bounds(actor).topleft)
             #if sprite.direction != 90 and sprite.size != 100:
-            angle = -(sprite.direction - 90)
-            scale = sprite.size / 100.0
+            angle = -(actor.direction - 90)
+            scale = actor.size / 100.0
             surface = pygame.transform.rotozoom(surface, angle, scale)
 
         if offset:
@@ -163,18 +466,24 @@ class PygameScreen(skip.Screen):
             (x, y) = pos
             pos = (x + ox, y + oy)
 
-        ghost = sprite.graphic_effects['ghost']
-        if ghost != 0:
-            opacity = (100 - abs(ghost)) * 2.55
-            blit_alpha(onto_surface, surface, pos, opacity)
-        else:
-            onto_surface.blit(surface, pos)
+        onto_surface.blit(surface, pos)
 
     def pos_to_screen(self, (x, y)):
-        return (int(x) + 240,  180 - int(y))
+        return (int(x) + STAGE_WIDTH // 2, STAGE_HEIGHT // 2 - int(y))
 
     def pos_from_screen(self, (x, y)):
-        return (x - 240, 180 - y)
+        return (x - STAGE_WIDTH // 2, STAGE_HEIGHT // 2 - y)
+
+    def pos_from_window(self, (x, y)):
+        """Convert a window position, eg. of the mouse, to the stage."""
+        viewport = self.viewport
+        x = (x - viewport.left) * STAGE_WIDTH // viewport.width
+        y = (y - viewport.top) * STAGE_HEIGHT // viewport.height
+        return self.pos_from_screen((x, y))
+
+    def rect_to_screen(self, rect):
+        (left, top) = self.pos_to_screen(rect.topleft)
+        return pygame.Rect(left, top, rect.width, rect.height)
 
     def draw_stage_without_sprite(self, sprite):
         rect = skip.bounds(sprite)
@@ -182,54 +491,85 @@ class PygameScreen(skip.Screen):
         offset = (-x, -y)
         surface = pygame.Surface(rect.size).convert_alpha()
         self.draw_sprite(self.project.stage, surface, offset)
-        surface.blit(self.pen_surface, (0, 0))
-        for actor in self.project.actors:
+        with self.pen_lock:
+            surface.blit(self.pen_surface, (0, 0))
+        for actor in self.interpreter.layers.visible():
             if actor is not sprite:
-                if isinstance(actor, kurt.Scriptable):
-                    if actor.is_visible:
-                        self.draw_sprite(actor, surface, offset)
+                self.draw_sprite(actor, surface, offset)
         return surface
 
     # ScriptEvent handlers
 
+    def say(self, sprite, kind, message):
+        if message is None or message == "":
+            self.bubbles.pop(sprite, None)
+        else:
+            self.bubbles[sprite] = (kind, skip.text.format_value(message))
+
     def clear(self):
-        self.pen_surface.fill((0,0,0,0))
+        with self.pen_lock:
+            self.pen_surface.fill((0,0,0,0))
 
     def stamp(self, sprite):
-        self.draw_sprite(sprite, self.pen_surface)
+        with self.pen_lock:
+            self.draw_sprite(sprite, self.pen_surface)
 
     # Script methods
 
     def draw_line(self, start, end, color, size):
         start = self.pos_to_screen(start)
         end = self.pos_to_screen(end)
-        pygame.draw.line(self.pen_surface, color.value, start, end, size)
+        with self.pen_lock:
+            pygame.draw.line(self.pen_surface, color.value, start, end, size)
+
+    def get_pen_image(self):
+        with self.pen_lock:
+            return pygame.image.tostring(self.pen_surface, "RGBA")
+
+    def set_pen_image(self, data):
+        if data is None:
+            self.clear()
+        else:
+            image = pygame.image.fromstring(data, kurt.Stage.SIZE, "RGBA")
+            with self.pen_lock:
+                self.pen_surface = image.convert_alpha()
+
+    def sense_input(self):
+        pressed = pygame.key.get_pressed()
+        keys = frozenset(name for (name, key) in self.KEYS_BY_NAME.items()
+                         if pressed[key])
+        return Input(self.pos_from_window(pygame.mouse.get_pos()),
+                     bool(pygame.mouse.get_pressed()[0]), keys)
 
     def get_mouse_pos(self):
-        return self.pos_from_screen(pygame.mouse.get_pos())
+        return self.input.mouse_pos
 
     def is_mouse_down(self):
-        return pygame.mouse.get_pressed()[0]
+        return self.input.mouse_down
 
     def is_key_pressed(self, name):
-        if name.endswith(" arrow"):
-            name = name[:-6]
-        key = self.KEYS_BY_NAME[name]
-        return pygame.key.get_pressed()[key]
+        return name in self.input.keys
 
     def touching_mouse(self, sprite):
         mask = self.get_sprite_mask(sprite)
         (x, y) = self.pos_to_screen(skip.bounds(sprite).topleft)
-        (mx, my) = pygame.mouse.get_pos()
+        (mx, my) = self.pos_to_screen(self.get_mouse_pos())
         return bool(mask.get_at((int(mx - x), int(my - y))))
 
     def touching_sprite(self, sprite, other):
+        return bool(self.touching_sprites(sprite, [other]))
+
+    def touching_sprites(self, sprite, others):
+        get_bounds = self.interpreter.get_bounds
         mask = self.get_sprite_mask(sprite)
-        other_mask = self.get_sprite_mask(other)
-        (x, y) = self.pos_to_screen(skip.bounds(sprite).topleft)
-        (ox, oy) = self.pos_to_screen(skip.bounds(other).topleft)
-        offset = (int(ox - x), int(oy - y))
-        return bool(mask.overlap(other_mask, offset))
+        (x, y) = self.pos_to_screen(get_bounds(sprite).topleft)
+        touching = []
+        for other in others:
+            (ox, oy) = self.pos_to_screen(get_bounds(other).topleft)
+            offset = (int(ox - x), int(oy - y))
+            if mask.overlap(self.get_sprite_mask(other), offset):
+                touching.append(other)
+        return touching
 
     def touching_color(self, sprite, color):
         rendered_surface = self.draw_stage_without_sprite(sprite)
@@ -249,31 +589,169 @@ class PygameScreen(skip.Screen):
             yield
         yield ""
 
-    def play_sound(self, sound):
-        pass # TODO
+    def play_sound(self, scriptable, sound):
+        return self.mixer.play_sound(sound, scriptable.volume, scriptable)
 
-    def play_sound_until_done(self, sound):
-        self.play_sound(sound)
-        while 0: # sync: yield while playing
-            yield
+    def play_sound_until_done(self, scriptable, sound):
+        voice = self.play_sound(scriptable, sound)
+        while not voice.is_done:
+            # Offline, sound is only mixed between ticks
+            yield None if self.mixer.sink.realtime else skip.END_FRAME
 
     def stop_sounds(self):
-        pass # TODO
+        self.mixer.stop_all()
+
+    def clock_changed(self):
+        self.mixer.rebase(self.interpreter.now())
+
+    def play_note(self, scriptable, note, duration):
+        self.mixer.play_note(note, duration, scriptable.instrument,
+                             scriptable.volume)
+
+    def play_drum(self, scriptable, drum):
+        self.mixer.play_drum(drum, scriptable.volume)
+
 
-    def play_note(self, drum, duration):
-        pass
 
-    def play_drum(self, drum, duration):
-        pass
+class Renderer(threading.Thread):
+    """Draws the latest :class:`skip.RenderState` submitted by the screen.
+
+    States submitted while a frame is being drawn replace each other, so the
+    interpreter never waits for the display; the ones never drawn are
+    counted in :attr:`dropped`.
+
+    """
+
+    def __init__(self, screen):
+        threading.Thread.__init__(self, name="skip renderer")
+        self.daemon = True
+        self.screen = screen
+        self.condition = threading.Condition()
+        self.running = True
+        self.frame = None # (render state, overlays)
+        self.rendered = 0
+        self.dropped = 0
+
+    def submit(self, render_state, overlays):
+        with self.condition:
+            if self.frame is not None:
+                self.dropped += 1
+            self.frame = (render_state, overlays)
+            self.condition.notify()
+
+    def stop(self):
+        """Draw the last frame submitted, and stop."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.frame is None:
+                    self.condition.wait()
+                if self.frame is None: # stopped
+                    return
+                (render_state, overlays) = self.frame
+                self.frame = None
+            self.screen.render(render_state, overlays)
+            self.rendered += 1
 
 
 
 def main():
-    project = None
-    if len(sys.argv) == 2:
-        project = kurt.Project.load(sys.argv[1])
+    parser = argparse.ArgumentParser(
+            description="Run a Scratch project in a Pygame window.")
+    parser.add_argument("project", nargs="?",
+            help="a Scratch file; an empty project if left out")
+    parser.add_argument("--fps", type=int, default=40,
+            help="most frames per second (default: %(default)s)")
+    parser.add_argument("--turbo", action="store_true",
+            help="run as many frames per second as possible")
+    parser.add_argument("--fixed", action="store_true",
+            help="run the interpreter in fixed steps; see --timestep")
+    parser.add_argument("--timestep", metavar="SECONDS", type=float,
+            default=1.0 / 40,
+            help="length of a fixed step (default: 1/40s)")
+    parser.add_argument("--threaded", action="store_true",
+            help="draw frames on a separate thread")
+    parser.add_argument("--engine", choices=skip.Interpreter.ENGINES,
+            default=PygameScreen.engine, help="how scripts are run")
+    parser.add_argument("--scale", type=float, default=1,
+            help="size of the window, relative to the stage")
+    parser.add_argument("--fullscreen", action="store_true",
+            help="fill the display")
+    parser.add_argument("--pixelated", action="store_true",
+            help="scale the stage without smoothing")
+    parser.add_argument("--headless", action="store_true",
+            help="no window or sound device")
+    parser.add_argument("--frames", type=int,
+            help="run the project for this many frames, then exit, "
+                 "instead of reading blocks from stdin")
+    parser.add_argument("--seed", type=int, help="random seed")
+    parser.add_argument("--profile", metavar="PATH", nargs="?", const=True,
+            default=False, help="profile the project, and print the report "
+                                "on exit or write it to PATH")
+    parser.add_argument("--record", metavar="PATH",
+            help="record the session's input; see skip.replay")
+    parser.add_argument("--effects-cache", type=int,
+            default=PygameScreen.effects_cache_size, metavar="N",
+            help="graphic-effect surfaces to cache (default: %(default)s)")
+    parser.add_argument("--text-cache", type=int,
+            default=PygameScreen.text_cache_size, metavar="N",
+            help="rendered text surfaces to cache (default: %(default)s)")
+    parser.add_argument("--mask-cache", type=int,
+            default=PygameScreen.mask_cache_size, metavar="N",
+            help="transformed collision masks to cache (default: "
+                 "%(default)s)")
+    args = parser.parse_args()
+    if args.frames is not None and not args.project:
+        parser.error("--frames needs a project")
+    if args.timestep <= 0:
+        parser.error("--timestep must be positive")
+
+    audio_sink = None
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+        audio_sink = skip.audio.NullSink()
 
-    skip.main(project, PygameScreen())
+    project = None
+    if args.project:
+        project = skip.lazy.load(args.project)
+
+    timestep = args.timestep if args.fixed else None
+    screen = PygameScreen(args.threaded, audio_sink, timestep,
+                          0 if args.turbo else args.fps, args.scale,
+                          args.fullscreen, not args.pixelated)
+    screen.engine = args.engine
+    screen.effects_cache_size = args.effects_cache
+    screen.text_cache_size = args.text_cache
+    screen.mask_cache_size = args.mask_cache
+    if args.record:
+        from skip import replay # it imports this module
+        screen.recorder = replay.Recorder(args.record, args.seed)
+    elif args.seed is not None:
+        random.seed(args.seed)
+
+    try:
+        if args.frames is None:
+            skip.main(project, screen, args.profile)
+        else:
+            screen.set_project(project)
+            screen.interpreter.start()
+            if args.profile:
+                skip.start_profiler(screen.interpreter,
+                        None if args.profile is True else args.profile)
+            for i in range(args.frames):
+                screen.tick()
+                if not screen.running:
+                    break
+    finally:
+        if screen.recorder:
+            screen.recorder.close()
 
 
 
@@ -0,0 +1,124 @@
+"""Conditions which are only re-evaluated when what they read changes.
+
+"wait until" and "repeat until" check their condition every frame. Most of
+the time nothing the condition depends on has changed, so a
+:class:`Condition` records what it reads, and keeps the last result until
+one of those changes.
+
+Blocks are sorted by the ``kind`` they're registered with (see
+:attr:`skip.Interpreter.KINDS`):
+
+* ``"pure"`` blocks depend only on their arguments.
+
+* ``"attribute"`` blocks read variables, lists or sprite attributes. Their
+  values are tracked exactly: the condition is re-evaluated only if one of
+  them changes.
+
+* ``"sensing"`` blocks read input or the screen. Conditions using them are
+  re-evaluated once per frame, or when the sprite itself moves or changes.
+
+Anything else (eg. "pick random", or the "timer", which moves on inside an
+"all at once" loop) is re-evaluated on every check.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import kurt
+
+
+
+# How often a condition has to be re-evaluated.
+STABLE = 0  # when something it reads changes
+FRAME = 1   # once per frame
+ALWAYS = 2  # every time
+
+LEVEL_NAMES = ['stable', 'frame', 'always']
+
+
+def sprite_state(s):
+    """The attributes of a scriptable which affect sensing blocks."""
+    if isinstance(s, kurt.Sprite):
+        return (s.costume, s.is_visible, s.position, s.direction, s.size)
+    return (s.costume,)
+
+
+class Condition(object):
+    """A boolean expression evaluated on a scriptable."""
+
+    def __init__(self, interpreter, s, expression):
+        self.interpreter = interpreter
+        self.s = s
+        self.expression = expression
+
+        self.reads = []
+        """Blocks whose values the condition depends on."""
+
+        self.level = self.analyze(expression)
+
+        self.key = None
+        self.value = None
+        self.checks = 0
+        self.evaluations = 0
+
+    def __repr__(self):
+        return "<Condition(%s, %i reads)>" % (LEVEL_NAMES[self.level],
+                                              len(self.reads))
+
+    def analyze(self, value):
+        """Return the level of an expression, collecting its reads."""
+        if not isinstance(value, kurt.Block):
+            return STABLE
+
+        (block, f) = self.interpreter.resolve(value)
+        level = STABLE
+        for arg in block.args:
+            level = max(level, self.analyze(arg))
+
+        kind = self.interpreter.KINDS.get(block.type)
+        if kind == "pure":
+            return level
+        elif kind == "attribute" and level == STABLE:
+            self.reads.append(block)
+            return STABLE
+        elif kind == "sensing":
+            return max(level, FRAME)
+        else:
+            return ALWAYS
+
+    def fingerprint(self):
+        evaluate = self.interpreter.evaluate
+        key = []
+        for block in self.reads:
+            value = evaluate(self.s, block)
+            key.append((value.__class__, value))
+        if self.level == FRAME:
+            key.append(self.interpreter.frame)
+            key.append(sprite_state(self.s))
+        return key
+
+    def check(self):
+        """Return the value of the condition."""
+        self.checks += 1
+        if self.level != ALWAYS:
+            key = self.fingerprint()
+            if key == self.key:
+                return self.value
+            self.key = key
+
+        self.evaluations += 1
+        self.value = self.interpreter.evaluate(self.s, self.expression)
+        return self.value
@@ -0,0 +1,278 @@
+"""Recording and replaying the input of a session.
+
+A :class:`Recorder` saves what the screen sensed at the start of each frame
+-- the interpreter clock, mouse position and button, which keys are held and
+the ScreenEvents -- along with the random seed. :class:`ReplayScreen` feeds a
+recording back to a project, so the run is the same each time, and times
+each frame.
+
+Record a session with::
+
+    $ python skip/pygame_screen.py --record session.rec game.sb
+
+and replay it without a window with::
+
+    $ python -m skip.replay session.rec game.sb
+
+Add ``--wav out.wav`` to save the sound it makes.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import os
+import random
+import struct
+import sys
+import time
+
+import kurt
+import skip
+import skip.audio
+import skip.lazy
+import skip.pygame_screen
+from skip import ScreenEvent
+
+
+
+MAGIC = "SKIPREC\0"
+FORMAT_VERSION = 1
+
+# magic, version, random seed
+HEADER = struct.Struct("<8sHI")
+
+# clock, mouse x, mouse y, mouse down, keys held, number of events
+FRAME = struct.Struct("<dhhBQB")
+
+KEY_NAMES = kurt.Insert(None, "key").options()
+
+# Events are stored as one byte: a kind, or KEY_PRESSED plus the key's index.
+MOUSE_DOWN = 0
+MOUSE_UP = 1
+KEY_PRESSED = 2
+
+
+class FrameInput(skip.pygame_screen.Input):
+    """What was sensed during one frame."""
+    __slots__ = ('clock', 'events')
+
+    def __init__(self, clock, mouse_pos, mouse_down, keys, events):
+        skip.pygame_screen.Input.__init__(self, mouse_pos, mouse_down, keys)
+        self.clock = clock
+        self.events = events
+
+    def __repr__(self):
+        return "<FrameInput(%.3f, %r, %i events)>" % (self.clock,
+                self.mouse_pos, len(self.events))
+
+
+def encode_event(event):
+    if event.kind == "mouse_down":
+        return MOUSE_DOWN
+    elif event.kind == "mouse_up":
+        return MOUSE_UP
+    elif event.kind == "key_pressed":
+        return KEY_PRESSED + KEY_NAMES.index(event.value)
+    raise ValueError("can't record %r" % event)
+
+def decode_event(code):
+    if code == MOUSE_DOWN:
+        return ScreenEvent("mouse_down")
+    elif code == MOUSE_UP:
+        return ScreenEvent("mouse_up")
+    return ScreenEvent("key_pressed", KEY_NAMES[code - KEY_PRESSED])
+
+def clamp_short(value):
+    return max(-32768, min(int(value), 32767))
+
+
+
+#-- Recording --#
+
+class Recorder(object):
+    """Writes a recording to a file, one frame at a time.
+
+    Seeds :mod:`random`, so create it before the project is started. While
+    recording, the interpreter's clock only moves between ticks.
+
+    """
+
+    def __init__(self, path, seed=None):
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.path = path
+        self.seed = seed
+        self.frames = 0
+        random.seed(seed)
+
+        self.fp = open(path, "wb")
+        self.fp.write(HEADER.pack(MAGIC, FORMAT_VERSION, seed))
+
+    def __repr__(self):
+        return "<Recorder(%r, %i frames)>" % (self.path, self.frames)
+
+    def record_frame(self, screen, events):
+        """Save the screen's input state and the frame's events."""
+        keys = 0
+        for name in screen.input.keys:
+            keys |= 1 << KEY_NAMES.index(name)
+        (x, y) = screen.input.mouse_pos
+        codes = [encode_event(event) for event in events]
+
+        interpreter = screen.interpreter
+        if interpreter.timestep is None:
+            interpreter.frame_time = None
+            interpreter.frame_time = clock = interpreter.now()
+        else:
+            clock = interpreter.step_clock # the time of the next tick
+
+        self.fp.write(FRAME.pack(clock, clamp_short(x),
+                                 clamp_short(y), screen.input.mouse_down,
+                                 keys, len(codes)))
+        self.fp.write(struct.pack("%iB" % len(codes), *codes))
+        self.frames += 1
+
+    def close(self):
+        self.fp.close()
+
+
+class Recording(object):
+    """A recording read back from a file."""
+
+    def __init__(self, seed, frames):
+        self.seed = seed
+        self.frames = frames
+
+    def __repr__(self):
+        return "<Recording(%i frames)>" % len(self.frames)
+
+    @classmethod
+    def load(cls, path):
+        f = open(path, "rb")
+        data = f.read()
+        f.close()
+
+        (magic, version, seed) = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a recording: %r" % path)
+        if version != FORMAT_VERSION:
+            raise ValueError("unsupported recording version %r" % version)
+
+        frames = []
+        offset = HEADER.size
+        while offset < len(data):
+            (clock, x, y, mouse_down, key_bits,
+             count) = FRAME.unpack_from(data, offset)
+            offset += FRAME.size
+            codes = struct.unpack_from("%iB" % count, data, offset)
+            offset += count
+
+            keys = frozenset(name for (index, name) in enumerate(KEY_NAMES)
+                             if key_bits & (1 << index))
+            events = [decode_event(code) for code in codes]
+            frames.append(FrameInput(clock, (x, y), bool(mouse_down), keys,
+                                     events))
+        return cls(seed, frames)
+
+
+
+#-- Replay --#
+
+class ReplayScreen(skip.pygame_screen.PygameScreen):
+    """Runs a project with input from a :class:`Recording`, as fast as
+    possible.
+
+    The interpreter's clock follows the recording, so timed blocks behave as
+    they did when it was recorded. The time taken by each frame is kept in
+    :attr:`frame_times`.
+
+    """
+
+    def __init__(self, recording, audio_sink=None):
+        """
+        :param audio_sink: defaults to a :class:`skip.audio.NullSink`.
+
+        """
+        skip.pygame_screen.PygameScreen.__init__(self,
+                audio_sink=audio_sink or skip.audio.NullSink())
+        self.recording = recording
+        self.frame_times = []
+
+    def set_project(self, project):
+        skip.pygame_screen.PygameScreen.set_project(self, project)
+        random.seed(self.recording.seed)
+        self.frame_index = 0
+        self.interpreter.frame_time = 0
+
+    def tick(self):
+        if self.frame_index >= len(self.recording.frames):
+            self.running = False
+            return
+        self.input = self.recording.frames[self.frame_index]
+        self.frame_index += 1
+        self.interpreter.frame_time = self.input.clock
+
+        start_time = time.time()
+        self.step(self.input.events)
+        self.render(self.interpreter.take_render_state())
+        self.frame_times.append(time.time() - start_time)
+
+    def run(self):
+        """Replay the whole recording. Returns :attr:`frame_times`."""
+        self.interpreter.start()
+        while self.running:
+            self.tick()
+        self.mixer.close()
+        self.release_assets()
+        return self.frame_times
+
+    def report(self):
+        times = sorted(self.frame_times)
+        if not times:
+            return "no frames"
+        total = sum(times)
+        return ("%i frames in %.2fs: mean %.2fms, median %.2fms, "
+                "95%% %.2fms, max %.2fms" % (len(times), total,
+                total / len(times) * 1000, times[len(times) // 2] * 1000,
+                times[int(len(times) * 0.95)] * 1000, times[-1] * 1000))
+
+
+
+def main():
+    args = sys.argv[1:]
+    audio_sink = None
+    if "--wav" in args:
+        index = args.index("--wav")
+        audio_sink = skip.audio.WaveSink(args[index + 1])
+        del args[index:index + 2]
+    if len(args) != 2:
+        print "Usage: python -m skip.replay [--wav out.wav] recording project"
+        sys.exit(1)
+    (path, project_path) = args
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    recording = Recording.load(path)
+    project = skip.lazy.load(project_path)
+
+    screen = ReplayScreen(recording, audio_sink)
+    screen.set_project(project)
+    screen.run()
+    print screen.report()
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Running a project many times, eg. for grading, by forking.
+
+A :class:`PreforkServer` loads the project once, sets up a headless screen
+and interpreter, decodes every costume and sound, and compiles its scripts.
+Then for each run it forks a child, which shares all of that with the parent
+copy-on-write, so a run starts straight away. Each run has its own random
+seed, or replays a recording made with :mod:`skip.replay`, and reports the
+project's variables and lists at the end as a line of JSON.
+
+Run with seeds::
+
+    $ python -m skip.server game.sb --frames 400 --seeds 1 2 3
+
+or recordings::
+
+    $ python -m skip.server game.sb --recordings a.rec b.rec
+
+With neither, a job is read from each line of stdin -- a seed, or the path to
+a recording -- until it's closed. Unix only.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import argparse
+import collections
+import gc
+import json
+import os
+import random
+import select
+import sys
+import time
+
+import kurt
+import skip
+import skip.audio
+import skip.pygame_screen
+import skip.replay
+
+
+
+TIMESTEP = 1.0 / 40
+
+
+class Job(object):
+    """One run of the project: either a random seed, or a recording to
+    replay, which has its own seed.
+
+    """
+
+    def __init__(self, seed=None, recording=None):
+        self.seed = seed
+        self.recording = recording
+
+    def __repr__(self):
+        return "<Job(%r, %r)>" % (self.seed, self.recording)
+
+    @classmethod
+    def parse(cls, line):
+        """A job from a line of input: a seed, or a recording's path."""
+        line = line.strip()
+        try:
+            return cls(seed=int(line))
+        except ValueError:
+            return cls(recording=line)
+
+
+class JobReader(object):
+    """Reads a :class:`Job` from each line of a file descriptor, eg. stdin,
+    as lines arrive, so the server can wait for them and for results at the
+    same time.
+
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.buffer = ""
+        self.jobs = collections.deque()
+        self.closed = False
+
+    def __repr__(self):
+        return "<JobReader(%i, %i jobs)>" % (self.fd, len(self.jobs))
+
+    def fileno(self):
+        return self.fd
+
+    def read(self):
+        """Read what's available. Only call it when select says so."""
+        data = os.read(self.fd, 65536)
+        if not data:
+            self.closed = True
+            data = "\n" # the last line may not end in one
+        lines = (self.buffer + data).split("\n")
+        self.buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                self.jobs.append(Job.parse(line))
+
+
+def error_result(job, message):
+    if isinstance(message, str):
+        message = message.decode("utf-8", "replace")
+    return {'seed': job.seed, 'recording': job.recording, 'error': message}
+
+
+class PreforkServer(object):
+    """Forks a prepared interpreter once for every :class:`Job`.
+
+    :param frames: how many frames to run for, if not replaying a recording.
+    :param workers: most runs at once.
+
+    """
+
+    def __init__(self, project, frames=400, workers=1, engine="generator"):
+        self.project = project
+        self.frames = frames
+        self.workers = workers
+        self.engine = engine
+        self.screen = None
+
+    def __repr__(self):
+        return "<PreforkServer(%r, %i workers)>" % (self.project.name,
+                                                    self.workers)
+
+    def prepare(self):
+        """Do everything the runs have in common, so the children don't."""
+        screen = skip.pygame_screen.PygameScreen(
+                audio_sink=skip.audio.NullSink(), timestep=TIMESTEP, fps=0)
+        screen.engine = self.engine
+        screen.set_project(self.project)
+        interpreter = screen.interpreter
+
+        for scriptable in [self.project.stage] + self.project.sprites:
+            for costume in scriptable.costumes:
+                screen.get_mask(costume.image)
+            for sound in scriptable.sounds:
+                screen.mixer.get_sound(sound)
+        for scripts in interpreter.hats.values():
+            for (scriptable, script) in scripts:
+                if self.engine == "vm":
+                    interpreter.compile(script)
+                else:
+                    interpreter.prepare(script)
+        gc.collect()
+        self.screen = screen
+
+    # Children
+
+    def run(self, job):
+        """Run the project for a job, and return the result. Only call this
+        in a child -- it changes the prepared interpreter.
+
+        """
+        start_time = time.time()
+        screen = self.screen
+        interpreter = screen.interpreter
+        if job.recording:
+            recording = skip.replay.Recording.load(job.recording)
+            seed = recording.seed
+            frames = recording.frames
+            # the clock follows the recording, as in ReplayScreen
+            interpreter.set_timestep(None)
+            interpreter.frame_time = 0
+        else:
+            seed = job.seed
+            frames = [None] * self.frames
+        random.seed(seed)
+        interpreter.start()
+
+        for frame in frames:
+            events = []
+            if frame:
+                screen.input = frame
+                interpreter.frame_time = frame.clock
+                events = frame.events
+            screen.step(events)
+            if not screen.running:
+                break
+
+        return {
+            'seed': seed,
+            'recording': job.recording,
+            'frames': len(frames),
+            'seconds': time.time() - start_time,
+            'variables': self.variables(),
+            'lists': self.lists(),
+        }
+
+    def variables(self):
+        result = {}
+        for scriptable in [self.project] + self.project.sprites:
+            prefix = ("" if scriptable is self.project
+                      else scriptable.name + ": ")
+            for (name, variable) in scriptable.variables.items():
+                result[prefix + name] = variable.value
+        return result
+
+    def lists(self):
+        result = {}
+        for scriptable in [self.project] + self.project.sprites:
+            prefix = ("" if scriptable is self.project
+                      else scriptable.name + ": ")
+            for (name, list_) in scriptable.lists.items():
+                result[prefix + name] = list(list_.items)
+        return result
+
+    def fork(self, job):
+        """Start a child running a job. Returns ``(pid, fd)``, where the
+        child writes its result to ``fd`` as a line of JSON.
+
+        """
+        (read_fd, write_fd) = os.pipe()
+        pid = os.fork()
+        if pid:
+            os.close(write_fd)
+            return (pid, read_fd)
+
+        os.close(read_fd)
+        status = 0
+        try:
+            try:
+                data = json.dumps(self.run(job), sort_keys=True)
+            except Exception, e: # including results which aren't JSON
+                message = "%s: %s" % (type(e).__name__, e)
+                data = json.dumps(error_result(job, message), sort_keys=True)
+                status = 1
+            data += "\n"
+            while data:
+                data = data[os.write(write_fd, data):]
+        finally:
+            os._exit(status) # skip atexit handlers and pygame.quit
+
+    # Parent
+
+    def serve(self, jobs):
+        """Run jobs, :attr:`workers` at a time. Yields each result, as a line
+        of JSON, as it finishes.
+
+        :param jobs: :class:`Job` objects, or a :class:`JobReader` to run
+                     them as they arrive.
+
+        """
+        if self.screen is None:
+            self.prepare()
+        reader = jobs if isinstance(jobs, JobReader) else None
+        jobs = iter(() if reader else jobs)
+        def take():
+            if reader:
+                return reader.jobs.popleft() if reader.jobs else None
+            return next(jobs, None)
+
+        running = {} # fd: (job, pid, output)
+        while True:
+            while len(running) < self.workers:
+                job = take()
+                if job is None:
+                    break
+                (pid, fd) = self.fork(job)
+                running[fd] = (job, pid, [])
+
+            waiting = list(running)
+            if reader and not reader.closed and len(running) < self.workers:
+                waiting.append(reader.fileno())
+            if not waiting:
+                return
+
+            (ready, _, _) = select.select(waiting, [], [])
+            for fd in ready:
+                if fd not in running:
+                    reader.read()
+                    continue
+                data = os.read(fd, 65536)
+                if data:
+                    running[fd][2].append(data)
+                    continue
+                (job, pid, output) = running.pop(fd)
+                os.close(fd)
+                (_, status) = os.waitpid(pid, 0)
+                line = "".join(output).rstrip("\n")
+                if not line: # it died
+                    result = error_result(job,
+                            "child exited with status %i" % status)
+                    line = json.dumps(result, sort_keys=True)
+                yield line
+
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description="Run a Scratch project many times, forking a "
+                        "prepared interpreter for each run.")
+    parser.add_argument("project", help="a Scratch file")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[],
+            help="run once with each random seed")
+    parser.add_argument("--recordings", nargs="+", default=[],
+            metavar="PATH", help="replay each recording")
+    parser.add_argument("--frames", type=int, default=400,
+            help="frames to run with a seed (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1,
+            help="most runs at once (default: %(default)s)")
+    parser.add_argument("--engine", choices=skip.Interpreter.ENGINES,
+            default="generator", help="how scripts are run")
+    args = parser.parse_args()
+
+    jobs = ([Job(seed=seed) for seed in args.seeds] +
+            [Job(recording=path) for path in args.recordings])
+    if not jobs:
+        jobs = JobReader(sys.stdin.fileno())
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    start_time = time.time()
+    project = kurt.Project.load(args.project)
+    server = PreforkServer(project, args.frames, args.workers, args.engine)
+    server.prepare()
+    print >>sys.stderr, "prepared in %.2fs" % (time.time() - start_time)
+
+    for result in server.serve(jobs):
+        print result
+        sys.stdout.flush()
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Checkpoints of the running state of a Scratch interpreter."""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import cPickle as pickle
+import time
+
+import kurt
+
+
+
+FORMAT_VERSION = 2
+
+
+class Snapshot(object):
+    """The state of an Interpreter at the end of a frame.
+
+    Only contains plain Python values, so it can be pickled and restored into
+    another Interpreter running the same project, eg. to fork a run.
+
+    Scriptables are referred to by name, scripts by their index in
+    :attr:`kurt.Scriptable.scripts`.
+
+    """
+
+    def __init__(self, state):
+        self.state = state
+
+    def __repr__(self):
+        return "<Snapshot(%i scriptables, %i threads)>" % (
+                len(self.state['scriptables']), len(self.state['threads']))
+
+    def dumps(self):
+        return pickle.dumps(self.state, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def loads(cls, data):
+        state = pickle.loads(data)
+        if state.get('version') != FORMAT_VERSION:
+            raise ValueError("unsupported snapshot version %r"
+                             % state.get('version'))
+        return cls(state)
+
+    def save(self, path):
+        f = open(path, "wb")
+        f.write(self.dumps())
+        f.close()
+        return path
+
+    @classmethod
+    def load(cls, path):
+        f = open(path, "rb")
+        data = f.read()
+        f.close()
+        return cls.loads(data)
+
+
+
+#-- Take --#
+
+def take(interpreter):
+    """Return a :class:`Snapshot` of the interpreter's current state."""
+    project = interpreter.project
+    scriptables = [project.stage] + project.sprites
+
+    state = {
+        'version': FORMAT_VERSION,
+        'clock': interpreter.now(),
+        'step_clock': interpreter.step_clock, # the time of the next tick
+        'timer': interpreter.now() - interpreter.timer_start,
+        'answer': interpreter.answer,
+        'tempo': project.tempo,
+        'variables': save_variables(project.variables),
+        'lists': save_lists(project.lists),
+        'scriptables': dict((s.name, save_scriptable(s)) for s in scriptables),
+        'layers': [sprite.name for sprite in interpreter.layers],
+        'threads': save_threads(interpreter),
+        'pen': interpreter.screen.get_pen_image(),
+    }
+    return Snapshot(state)
+
+def save_variables(variables):
+    return dict((name, v.value) for (name, v) in variables.items())
+
+def save_lists(lists):
+    return dict((name, list(l.items)) for (name, l) in lists.items())
+
+def save_scriptable(s):
+    state = {
+        'costume_index': s.costume_index,
+        'volume': s.volume,
+        'instrument': s.instrument,
+        'graphic_effects': dict(s.graphic_effects),
+        'variables': save_variables(s.variables),
+        'lists': save_lists(s.lists),
+    }
+    if isinstance(s, kurt.Sprite):
+        state.update({
+            'position': tuple(s.position),
+            'direction': s.direction,
+            'size': s.size,
+            'is_visible': s.is_visible,
+            'is_pen_down': s.pen.is_down,
+            'pen_size': s.pen.size,
+            'pen_color': tuple(s.pen.color.value),
+            'pen_hue': s.pen.hue,
+            'pen_shade': s.pen.shade,
+        })
+    return state
+
+def save_threads(interpreter):
+    """Threads are saved by the script they're running, along with their
+    program counter if the engine supports it.
+
+    Scripts which aren't in their scriptable's scripts (eg. ones typed into
+    the REPL) can't be referred to, and are left out.
+
+    They're kept in the order they run, so they run in the same order when
+    restored.
+
+    """
+    threads = []
+    new_threads = interpreter.new_threads
+    running = [(script, new_threads.get(script, thread))
+               for (script, thread) in interpreter.threads.items()]
+    starting = [(script, thread) for (script, thread) in new_threads.items()
+                if script not in interpreter.threads]
+    for (script, thread) in running + starting: # in the order they run
+        s = thread.scriptable
+        # by identity: scripts with the same blocks compare equal
+        index = next((i for (i, other) in enumerate(s.scripts)
+                      if other is script), None)
+        if index is None:
+            continue
+        threads.append({
+            'scriptable': s.name,
+            'script': index,
+            'state': thread.get_state(),
+        })
+    return threads
+
+
+
+#-- Restore --#
+
+def restore(interpreter, snapshot):
+    """Replace the interpreter's state with the snapshot's.
+
+    The interpreter must be running the same project (or a copy of it).
+
+    Threads resume where they were if they were saved with a program counter
+    (see :mod:`skip.vm`), otherwise they restart from the top of their script.
+
+    """
+    state = snapshot.state
+    project = interpreter.project
+    interpreter.stop()
+
+    by_name = dict((s.name, s) for s in [project.stage] + project.sprites)
+
+    interpreter.epoch = time.time() - state['clock']
+    interpreter.step_clock = state['step_clock']
+    if interpreter.frame_time is not None:
+        interpreter.frame_time = state['clock']
+    interpreter.timer_start = state['clock'] - state['timer']
+    interpreter.screen.clock_changed()
+    interpreter.answer = state['answer']
+    project.tempo = state['tempo']
+    restore_variables(project.variables, state['variables'])
+    restore_lists(project.lists, state['lists'])
+
+    for (name, s_state) in state['scriptables'].items():
+        if name in by_name:
+            restore_scriptable(by_name[name], s_state)
+
+    layers = [by_name[name] for name in state['layers'] if name in by_name]
+    others = [sprite for sprite in interpreter.layers
+              if sprite not in layers]
+    interpreter.reset_layers(others + layers)
+    interpreter.sync_layers()
+
+    for t_state in state['threads']:
+        s = by_name[t_state['scriptable']]
+        script = s.scripts[t_state['script']]
+        thread = interpreter.push_script(s, script)
+        if t_state['state'] is not None:
+            thread.set_state(t_state['state'])
+    interpreter.add_new_threads()
+
+    interpreter.screen.set_pen_image(state['pen'])
+
+def restore_variables(variables, values):
+    for (name, value) in values.items():
+        if name in variables:
+            variables[name].value = value
+        else:
+            variables[name] = kurt.Variable(value)
+
+def restore_lists(lists, values):
+    for (name, items) in values.items():
+        if name in lists:
+            lists[name].items = list(items)
+        else:
+            lists[name] = kurt.List(items)
+
+def restore_scriptable(s, state):
+    if state['costume_index'] is not None:
+        s.costume_index = state['costume_index']
+    s.volume = state['volume']
+    s.instrument = state['instrument']
+    s.graphic_effects.update(state['graphic_effects'])
+    restore_variables(s.variables, state['variables'])
+    restore_lists(s.lists, state['lists'])
+
+    if isinstance(s, kurt.Sprite):
+        s.position = state['position']
+        s.direction = state['direction']
+        s.size = state['size']
+        s.is_visible = state['is_visible']
+        s.pen.is_down = state['is_pen_down']
+        s.pen.size = state['pen_size']
+        s.pen.color = kurt.Color(state['pen_color'])
+        s.pen.hue = state['pen_hue']
+        s.pen.shade = state['pen_shade']
@@ -0,0 +1,308 @@
+"""Speech bubbles and watchers for the Pygame screen.
+
+Rasterising text is slow, so rendered text is cached by (string, style) in
+a :class:`TextCache`, and whole bubbles and watchers are kept until what
+they show changes.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import pygame
+
+import kurt
+
+
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GREY = (148, 145, 145)
+LIGHT_GREY = (193, 196, 199)
+VARIABLE_COLOR = (238, 125, 22)
+LIST_COLOR = (217, 77, 17)
+
+BUBBLE_WIDTH = 170    # text wraps at this width
+LIST_ITEMS_SHOWN = 10
+
+
+# Styles are (size, color, bold).
+BUBBLE_STYLE = (14, BLACK, False)
+LABEL_STYLE = (12, BLACK, True)
+VALUE_STYLE = (12, WHITE, False)
+LARGE_STYLE = (16, WHITE, True)
+
+
+class TextCache(object):
+    """Rendered text surfaces by (string, style).
+
+    Emptied when it grows past ``max_size``, so text which changes every
+    frame doesn't use unbounded memory.
+
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.surfaces = {}
+        self.fonts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "<TextCache(%i surfaces, %i hits, %i misses)>" % (
+                len(self.surfaces), self.hits, self.misses)
+
+    def font(self, style):
+        (size, color, bold) = style
+        if (size, bold) not in self.fonts:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.Font(None, size + 4)
+            font.set_bold(bold)
+            self.fonts[size, bold] = font
+        return self.fonts[size, bold]
+
+    def render(self, text, style=BUBBLE_STYLE):
+        key = (text, style)
+        try:
+            surface = self.surfaces[key]
+            self.hits += 1
+            return surface
+        except KeyError:
+            self.misses += 1
+        if len(self.surfaces) >= self.max_size:
+            self.surfaces.clear()
+        surface = self.font(style).render(text, True, style[1])
+        self.surfaces[key] = surface
+        return surface
+
+    def wrap(self, text, style, width):
+        """Split text into lines no wider than width."""
+        font = self.font(style)
+        lines = []
+        for paragraph in text.split("\n"):
+            line = ""
+            for word in paragraph.split(" "):
+                candidate = line + " " + word if line else word
+                if line and font.size(candidate)[0] > width:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = candidate
+            lines.append(line)
+        return lines
+
+
+def format_value(value):
+    if isinstance(value, float) and value == int(value):
+        value = int(value)
+    return unicode(value)
+
+def rounded_rect(surface, color, rect, radius):
+    """Fill a rectangle with rounded corners."""
+    rect = pygame.Rect(rect)
+    radius = min(radius, rect.width // 2, rect.height // 2)
+    surface.fill(color, rect.inflate(-2 * radius, 0))
+    surface.fill(color, rect.inflate(0, -2 * radius))
+    for corner in (rect.topleft, rect.topright, rect.bottomleft,
+                   rect.bottomright):
+        (x, y) = corner
+        x += radius if x == rect.left else -radius
+        y += radius if y == rect.top else -radius
+        pygame.draw.circle(surface, color, (x, y), radius)
+
+
+
+#-- Bubbles --#
+
+class Bubbles(object):
+    """Draws "say" and "think" bubbles next to sprites."""
+
+    def __init__(self, text_cache):
+        self.text_cache = text_cache
+        self.surfaces = {}
+
+    def get_surface(self, kind, text):
+        key = (kind, text)
+        if key not in self.surfaces:
+            if len(self.surfaces) > 256:
+                self.surfaces.clear()
+            self.surfaces[key] = self.render(kind, text)
+        return self.surfaces[key]
+
+    def render(self, kind, text):
+        lines = self.text_cache.wrap(text, BUBBLE_STYLE, BUBBLE_WIDTH)
+        rendered = [self.text_cache.render(line) for line in lines]
+        width = max(s.get_width() for s in rendered) + 16
+        height = sum(s.get_height() for s in rendered) + 12
+        tail = 12
+
+        surface = pygame.Surface((max(width, 40), height + tail),
+                                 pygame.SRCALPHA, 32)
+        box = pygame.Rect(0, 0, surface.get_width(), height)
+        rounded_rect(surface, GREY, box, 10)
+        rounded_rect(surface, WHITE, box.inflate(-4, -4), 8)
+        if kind == "think":
+            for (x, y, r) in ((14, height + 2, 4), (8, height + 8, 3)):
+                pygame.draw.circle(surface, GREY, (x, y), r + 1)
+                pygame.draw.circle(surface, WHITE, (x, y), r)
+        else:
+            points = [(10, height - 3), (22, height - 3), (6, height + tail)]
+            pygame.draw.polygon(surface, WHITE, points)
+            pygame.draw.lines(surface, GREY, False, points, 2)
+
+        y = 6
+        for line in rendered:
+            surface.blit(line, (8, y))
+            y += line.get_height()
+        return surface
+
+    def draw(self, onto_surface, kind, text, sprite_rect):
+        """Draw a bubble above the top-right of a sprite, in screen
+        coordinates, keeping it on the stage.
+
+        """
+        surface = self.get_surface(kind, text)
+        (width, height) = surface.get_size()
+        (stage_width, stage_height) = onto_surface.get_size()
+        x = min(max(0, sprite_rect.right - 10), stage_width - width)
+        y = min(max(0, sprite_rect.top - height), stage_height - height)
+        onto_surface.blit(surface, (x, y))
+
+
+
+#-- Watchers --#
+
+class Watchers(object):
+    """Draws watchers, re-rendering each only when what it shows changes."""
+
+    def __init__(self, text_cache, interpreter):
+        self.text_cache = text_cache
+        self.interpreter = interpreter
+        self.rendered = {} # watcher: (key, surface)
+
+    def label(self, watcher):
+        if watcher.kind == 'block':
+            label = watcher.block.stringify().strip("()")
+        else:
+            label = watcher.block.args[0]
+        if isinstance(watcher.target, kurt.Sprite):
+            label = watcher.target.name + " " + label
+        return label
+
+    def get_value(self, watcher):
+        if watcher.kind == 'variable':
+            return format_value(watcher.value.value)
+        elif watcher.kind == 'list':
+            return tuple(format_value(i) for i in watcher.value.items)
+        target = watcher.target
+        if isinstance(target, kurt.Project):
+            target = target.stage
+        return format_value(self.interpreter.evaluate(target, watcher.block))
+
+    def take_state(self, watchers):
+        """Return ``(watcher, key)`` for each watcher, where the key is what
+        it shows. Call this on the interpreter's thread.
+
+        """
+        return tuple((watcher, (watcher.style, self.get_value(watcher)))
+                     for watcher in watchers)
+
+    def draw(self, onto_surface, state):
+        """Draw watchers from :meth:`take_state`."""
+        y = 5
+        for (watcher, key) in state:
+            (old_key, surface) = self.rendered.get(watcher, (None, None))
+            if key != old_key:
+                surface = self.render(watcher, *key)
+                self.rendered[watcher] = (key, surface)
+
+            if watcher.pos:
+                pos = watcher.pos
+            else:
+                pos = (5, y)
+            onto_surface.blit(surface, pos)
+            y = pos[1] + surface.get_height() + 5
+
+    def render(self, watcher, style, value):
+        if watcher.kind == 'list':
+            return self.render_list(watcher, value)
+        render = self.text_cache.render
+
+        if style == 'large':
+            text = render(value, LARGE_STYLE)
+            surface = pygame.Surface((max(40, text.get_width() + 12),
+                                      text.get_height() + 6),
+                                     pygame.SRCALPHA, 32)
+            rounded_rect(surface, VARIABLE_COLOR, surface.get_rect(), 6)
+            surface.blit(text, text.get_rect(center=surface.get_rect().center))
+            return surface
+
+        label = render(self.label(watcher), LABEL_STYLE)
+        text = render(value, VALUE_STYLE)
+        value_width = max(40, text.get_width() + 10)
+        height = max(label.get_height(), text.get_height()) + 8
+        slider_height = 12 if style == 'slider' else 0
+        surface = pygame.Surface((label.get_width() + value_width + 20,
+                                  height + slider_height),
+                                 pygame.SRCALPHA, 32)
+        rounded_rect(surface, LIGHT_GREY, surface.get_rect(), 6)
+        surface.blit(label, (6, (height - label.get_height()) // 2))
+        box = pygame.Rect(label.get_width() + 12, 3, value_width, height - 6)
+        rounded_rect(surface, VARIABLE_COLOR, box, 5)
+        surface.blit(text, text.get_rect(center=box.center))
+        if slider_height:
+            self.render_slider(surface, watcher, height)
+        return surface
+
+    def render_slider(self, surface, watcher, top):
+        line = pygame.Rect(8, top + 3, surface.get_width() - 16, 4)
+        rounded_rect(surface, GREY, line, 2)
+        try:
+            value = float(watcher.value.value)
+        except ValueError:
+            value = watcher.slider_min
+        span = (watcher.slider_max - watcher.slider_min) or 1
+        t = max(0, min((value - watcher.slider_min) / float(span), 1))
+        x = line.left + int(t * line.width)
+        pygame.draw.circle(surface, WHITE, (x, line.centery), 5)
+        pygame.draw.circle(surface, GREY, (x, line.centery), 5, 1)
+
+    def render_list(self, watcher, items):
+        render = self.text_cache.render
+        label = render(self.label(watcher), LABEL_STYLE)
+        length = render("length: %i" % len(items), LABEL_STYLE)
+        shown = [render(item, VALUE_STYLE)
+                 for item in items[:LIST_ITEMS_SHOWN]]
+
+        width = max([100, label.get_width() + 12, length.get_width() + 12] +
+                    [s.get_width() + 36 for s in shown])
+        row_height = VALUE_STYLE[0] + 6
+        height = (label.get_height() + length.get_height() + 16 +
+                  row_height * max(1, len(shown)))
+        surface = pygame.Surface((width, height), pygame.SRCALPHA, 32)
+        rounded_rect(surface, LIGHT_GREY, surface.get_rect(), 6)
+        surface.blit(label, label.get_rect(centerx=width // 2, top=4))
+
+        y = label.get_height() + 8
+        for (index, item) in enumerate(shown, 1):
+            number = render(str(index), LABEL_STYLE)
+            surface.blit(number, (4, y + 2))
+            box = pygame.Rect(24, y, width - 30, row_height - 2)
+            rounded_rect(surface, LIST_COLOR, box, 4)
+            surface.blit(item, (box.left + 4, box.top + 2))
+            y += row_height
+        surface.blit(length, (6, height - length.get_height() - 4))
+        return surface
@@ -0,0 +1,413 @@
+"""An explicit-stack engine for running Scratch scripts.
+
+Scripts are compiled to a flat list of instructions, with control blocks
+turned into jumps. Each thread keeps a program counter and a stack of loop
+state, so resuming a thread costs the same however deeply its loops are
+nested -- unlike nested generators, which have to be re-entered one level at
+a time -- and its state is plain data which can be saved in a Snapshot.
+
+Use it with ``Interpreter(project, engine="vm")``.
+
+"""
+
+# Copyright (C) 2013 Tim Radvan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see {http://www.gnu.org/licenses/}.
+
+import inspect
+import math
+
+import kurt
+import skip
+
+
+
+#-- Instructions --#
+
+# (RUN, block)
+#     Evaluate a command block. If it returns a generator, run it to
+#     completion, passing on its events and yielding when it does.
+RUN = 0
+
+# (YIELD,)
+#     End the frame.
+YIELD = 1
+
+# (JUMP, target)
+JUMP = 2
+
+# (JUMP_IF_NOT, condition, insert, target)
+JUMP_IF_NOT = 3
+
+# (JUMP_IF, condition, target)
+#     Jump if a "repeat until" condition is true. See
+#     :meth:`skip.Interpreter.check_condition`.
+JUMP_IF = 4
+
+# (REPEAT, times, insert)
+#     Push the loop count.
+REPEAT = 5
+
+# (LOOP, target)
+#     Pop and jump to target when the count on the stack reaches zero,
+#     otherwise decrement it.
+LOOP = 6
+
+# (UNTIL, condition)
+#     Yield until a "wait until" condition is true.
+UNTIL = 7
+
+# (WAIT, duration, insert)
+#     Push the end time.
+WAIT = 8
+
+# (WAIT_LOOP,)
+#     Yield until the end time on the stack, then pop it. Yields even inside
+#     "all at once" if the clock only moves between ticks.
+WAIT_LOOP = 9
+
+# (GLIDE, (duration, insert), (x, insert), (y, insert))
+#     Push the start and end of the glide.
+GLIDE = 10
+
+# (GLIDE_LOOP,)
+#     Move towards the end of the glide on the stack, yielding until it's
+#     finished, then pop it. Yields like WAIT_LOOP.
+GLIDE_LOOP = 11
+
+# (ATOMIC, delta)
+#     Enter or leave an "all at once" block. Yields are skipped inside one.
+ATOMIC = 12
+
+OPCODE_NAMES = ['RUN', 'YIELD', 'JUMP', 'JUMP_IF_NOT', 'JUMP_IF', 'REPEAT',
+                'LOOP', 'UNTIL', 'WAIT', 'WAIT_LOOP', 'GLIDE', 'GLIDE_LOOP',
+                'ATOMIC']
+
+
+
+#-- Compiler --#
+
+class Code(object):
+    """A compiled script.
+
+    :attr:`blocks` holds the block each instruction was compiled from.
+
+    """
+
+    def __init__(self, script, instructions, blocks):
+        self.script = script
+        self.instructions = instructions
+        self.blocks = blocks
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __repr__(self):
+        return "<Code(%i instructions)>" % len(self.instructions)
+
+    def disassemble(self):
+        lines = []
+        for (pc, instruction) in enumerate(self.instructions):
+            args = ", ".join(a.stringify() if isinstance(a, kurt.Block)
+                             else repr(a) for a in instruction[1:]
+                             if not isinstance(a, kurt.Insert))
+            lines.append("%4i %-12s %s" % (pc, OPCODE_NAMES[instruction[0]],
+                                           args))
+        return "\n".join(lines)
+
+
+class Compiler(object):
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.instructions = []
+        self.blocks = []
+
+        self.control = {
+            skip.forever: self.compile_forever,
+            skip.repeat: self.compile_repeat,
+            skip.if_: self.compile_if,
+            skip.if_else: self.compile_if_else,
+            skip.wait_until: self.compile_wait_until,
+            skip.repeat_until: self.compile_repeat_until,
+            skip.all_at_once: self.compile_all_at_once,
+            skip.wait: self.compile_wait,
+            skip.glide_to_for_secs: self.compile_glide,
+        }
+
+    def compile(self, script):
+        self.compile_blocks(script)
+        return Code(script, self.instructions, self.blocks)
+
+    def emit(self, block, *instruction):
+        self.instructions.append(instruction)
+        self.blocks.append(block)
+        return len(self.instructions) - 1
+
+    def patch(self, index, target):
+        """Set the jump target of the instruction at index."""
+        self.instructions[index] = self.instructions[index][:-1] + (target,)
+
+    @property
+    def here(self):
+        return len(self.instructions)
+
+    def compile_blocks(self, blocks):
+        for block in blocks or []:
+            self.compile_block(block)
+
+    def compile_block(self, block):
+        if block.type.shape == "hat":
+            return
+        (block, f) = self.interpreter.resolve(block)
+        if f in self.control:
+            args = []
+            for (arg, insert) in zip(block.args, block.type.inserts):
+                if insert.unevaluated and insert.shape != "stack":
+                    insert = None # evaluated by the block itself
+                args.append((arg, insert))
+            self.control[f](block, *args)
+        else:
+            self.emit(block, RUN, block)
+
+    def compile_forever(self, block, (body, _)):
+        start = self.here
+        self.compile_blocks(body)
+        self.emit(block, YIELD)
+        self.emit(block, JUMP, start)
+
+    def compile_repeat(self, block, (times, insert), (body, _)):
+        self.emit(block, REPEAT, times, insert)
+        start = self.emit(block, LOOP, None)
+        self.compile_blocks(body)
+        self.emit(block, YIELD)
+        self.emit(block, JUMP, start)
+        self.patch(start, self.here)
+
+    def compile_if(self, block, (condition, insert), (body, _)):
+        jump = self.emit(block, JUMP_IF_NOT, condition, insert, None)
+        self.compile_blocks(body)
+        self.patch(jump, self.here)
+
+    def compile_if_else(self, block, (condition, insert), (body, _),
+                        (other_body, _2)):
+        jump = self.emit(block, JUMP_IF_NOT, condition, insert, None)
+        self.compile_blocks(body)
+        jump_end = self.emit(block, JUMP, None)
+        self.patch(jump, self.here)
+        self.compile_blocks(other_body)
+        self.patch(jump_end, self.here)
+
+    def compile_wait_until(self, block, (condition, _)):
+        self.emit(block, UNTIL, condition)
+
+    def compile_repeat_until(self, block, (condition, _), (body, _2)):
+        start = self.emit(block, JUMP_IF, condition, None)
+        self.compile_blocks(body)
+        self.emit(block, YIELD)
+        self.emit(block, JUMP, start)
+        self.patch(start, self.here)
+
+    def compile_all_at_once(self, block, (body, _)):
+        self.emit(block, ATOMIC, 1)
+        self.compile_blocks(body)
+        self.emit(block, ATOMIC, -1)
+        self.emit(block, YIELD)
+
+    def compile_wait(self, block, (duration, insert)):
+        self.emit(block, WAIT, duration, insert)
+        self.emit(block, WAIT_LOOP)
+
+    def compile_glide(self, block, duration, x, y):
+        self.emit(block, GLIDE, duration, x, y)
+        self.emit(block, GLIDE_LOOP)
+
+
+def compile_script(interpreter, script):
+    """Return the :class:`Code` for a script."""
+    return Compiler(interpreter).compile(script)
+
+
+
+#-- Threads --#
+
+class VMThread(object):
+    """Runs a compiled script.
+
+    The running state is just :attr:`pc`, :attr:`stack` and :attr:`atomic`.
+    Blocks which aren't compiled to instructions, like "say for secs", run as
+    a generator in :attr:`waiting`; the program counter stays on them until
+    they finish.
+
+    """
+
+    __slots__ = ('interpreter', 'code', 'scriptable', 'callback', 'pc',
+                 'stack', 'atomic', 'waiting')
+
+    def __init__(self, interpreter, code, scriptable, callback):
+        self.interpreter = interpreter
+        self.code = code
+        self.scriptable = scriptable
+        self.callback = callback
+
+        self.pc = 0
+        self.stack = []
+        self.atomic = 0
+        self.waiting = None
+
+    def tick(self):
+        interpreter = self.interpreter
+        evaluate = interpreter.evaluate
+        check_condition = interpreter.check_condition
+        instructions = self.code.instructions
+        end = len(instructions)
+        s = self.scriptable
+        stack = self.stack
+
+        while 1:
+            if self.waiting:
+                try:
+                    event = self.waiting.next()
+                except StopIteration:
+                    self.waiting = None
+                    self.pc += 1
+                else:
+                    if event is skip.END_FRAME:
+                        return
+                    elif event:
+                        yield event
+                    elif not self.atomic:
+                        return
+                continue
+
+            pc = self.pc
+            if pc >= end:
+                yield skip.STOP
+                return
+            instruction = instructions[pc]
+            op = instruction[0]
+
+            if op == RUN:
+                value = evaluate(s, instruction[1])
+                if inspect.isgenerator(value):
+                    self.waiting = value
+                else:
+                    self.pc = pc + 1
+
+            elif op == YIELD:
+                self.pc = pc + 1
+                if not self.atomic:
+                    return
+
+            elif op == JUMP:
+                self.pc = instruction[1]
+
+            elif op == JUMP_IF_NOT:
+                if evaluate(s, instruction[1], instruction[2]):
+                    self.pc = pc + 1
+                else:
+                    self.pc = instruction[3]
+
+            elif op == JUMP_IF:
+                if check_condition(s, instruction[1]):
+                    self.pc = instruction[2]
+                else:
+                    self.pc = pc + 1
+
+            elif op == LOOP:
+                if stack[-1] > 0:
+                    stack[-1] -= 1
+                    self.pc = pc + 1
+                else:
+                    stack.pop()
+                    self.pc = instruction[1]
+
+            elif op == REPEAT:
+                times = evaluate(s, instruction[1], instruction[2])
+                stack.append(int(math.ceil(times)))
+                self.pc = pc + 1
+
+            elif op == UNTIL:
+                if check_condition(s, instruction[1]):
+                    self.pc = pc + 1
+                elif not self.atomic:
+                    return
+
+            elif op == WAIT:
+                duration = evaluate(s, instruction[1], instruction[2])
+                stack.append(interpreter.now() + duration)
+                self.pc = pc + 1
+
+            elif op == WAIT_LOOP:
+                if interpreter.now() <= stack[-1]:
+                    if not self.atomic or interpreter.timing_yield():
+                        return
+                else:
+                    stack.pop()
+                    self.pc = pc + 1
+
+            elif op == GLIDE:
+                ((duration, d_insert), (x, x_insert),
+                 (y, y_insert)) = instruction[1:]
+                duration = evaluate(s, duration, d_insert)
+                end_pos = (evaluate(s, x, x_insert), evaluate(s, y, y_insert))
+                stack.append((tuple(s.position), end_pos, interpreter.now(),
+                              duration))
+                self.pc = pc + 1
+
+            elif op == GLIDE_LOOP:
+                ((start_x, start_y), (end_x, end_y), start_time,
+                 duration) = stack[-1]
+                now = interpreter.now()
+                if now <= start_time + duration:
+                    t = float(now - start_time) / duration if duration else 1
+                    skip.set_position(s, start_x * (1 - t)  +  end_x * t,
+                                         start_y * (1 - t)  +  end_y * t)
+                    if not self.atomic or interpreter.timing_yield():
+                        return
+                else:
+                    skip.set_position(s, end_x, end_y)
+                    stack.pop()
+                    self.pc = pc + 1
+
+            elif op == ATOMIC:
+                self.atomic += instruction[1]
+                self.pc = pc + 1
+
+            else:
+                raise ValueError("bad opcode %r" % op)
+
+    def finish(self):
+        if self.callback:
+            self.callback(self)
+
+    # Snapshots
+
+    def get_state(self):
+        """Return the running state as plain data.
+
+        A thread waiting on a generator block is saved as being at the start
+        of that block.
+
+        """
+        return {
+            'pc': self.pc,
+            'stack': list(self.stack),
+            'atomic': self.atomic,
+        }
+
+    def set_state(self, state):
+        self.pc = state['pc']
+        self.stack = list(state['stack'])
+        self.atomic = state['atomic']
+        self.waiting = None
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+import skip.assets
+import skip.lazy
+from skip.bench import make_media_project, save_like_scratch
+
+
+
+class AssetStoreTests(unittest.TestCase):
+    def setUp(self):
+        pygame.display.init()
+        pygame.display.set_mode((1, 1))
+        self.folder = tempfile.mkdtemp()
+        self.path = save_like_scratch(make_media_project(2, 2),
+                                      os.path.join(self.folder, "media.sb"))
+        self.store = skip.assets.AssetStore()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def images(self):
+        project = skip.lazy.load(self.path)
+        return [c.image for s in project.sprites for c in s.costumes]
+
+    def test_shared(self):
+        first = self.images()
+        second = self.images()
+        assets = [self.store.acquire(image) for image in first + second]
+        self.assertEqual(len(self.store), 4)
+        self.assertEqual((self.store.misses, self.store.hits), (4, 4))
+        self.assertEqual(assets[:4], assets[4:])
+
+    def test_images_not_kept_decoded(self):
+        images = self.images()
+        for image in images:
+            self.store.acquire(image)
+        for image in images:
+            self.assertFalse(image.is_decoded)
+
+    def test_release(self):
+        [image] = self.images()[:1]
+        asset = self.store.acquire(image)
+        self.store.acquire(image)
+        self.store.release(asset)
+        self.assertEqual(len(self.store), 1)
+        self.store.release(asset)
+        self.assertEqual(len(self.store), 0)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+from cStringIO import StringIO
+import os
+import unittest
+import wave
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy
+
+import kurt
+import skip
+import skip.audio
+from skip.pygame_screen import PygameScreen
+from skip.bench import run_frames
+
+
+
+def make_wave(seconds):
+    f = StringIO()
+    w = wave.open(f, "wb")
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(skip.audio.RATE)
+    w.writeframes("\0\1" * int(seconds * skip.audio.RATE))
+    w.close()
+    return f.getvalue()
+
+def make_project(*scripts):
+    project = kurt.Project()
+    sprite = kurt.Sprite(project, "Sprite1")
+    sprite.costume = kurt.Costume("square",
+                                  kurt.Image.new((60, 60), (0, 0, 0)))
+    sprite.sounds = [kurt.Sound("beep", kurt.Waveform(make_wave(0.5)))]
+    sprite.variables["done"] = kurt.Variable(0)
+    for script in scripts:
+        sprite.parse(script)
+    project.sprites.append(sprite)
+    project.convert("scratch14")
+    return project
+
+
+PLAY_UNTIL_DONE = """when green flag clicked
+play sound [beep v] until done
+change [done v] by (1)"""
+
+
+class MixerTests(unittest.TestCase):
+    def setUp(self):
+        self.mixer = skip.audio.Mixer(skip.audio.NullSink())
+        self.samples = numpy.zeros(1000, numpy.float32)
+
+    def test_stop_all(self):
+        voice = self.mixer.play(self.samples, key="a")
+        self.mixer.stop_all()
+        self.assertTrue(voice.is_done)
+
+    def test_restart(self):
+        first = self.mixer.play(self.samples, owner=1, key="a")
+        other = self.mixer.play(self.samples, owner=2, key="a")
+        second = self.mixer.play(self.samples, owner=1, key="a")
+        self.assertTrue(first.is_done)
+        self.assertFalse(other.is_done)
+        self.assertFalse(second.is_done)
+        self.assertEqual(self.mixer.voices, [other, second])
+
+
+class PlayUntilDoneTests(unittest.TestCase):
+    """"play sound until done" mustn't wait forever for a sound which was
+    stopped.
+
+    """
+
+    def run_project(self, project, frames=40, restart_at=None, screen=None):
+        screen = screen or PygameScreen(audio_sink=skip.audio.NullSink(),
+                                        timestep=1.0 / 40)
+        screen.set_project(project)
+        interpreter = screen.interpreter
+        interpreter.start()
+        for i in range(frames):
+            if i == restart_at:
+                interpreter.start()
+            screen.step([])
+        return project.sprites[0].variables["done"].value
+
+    def test_plays(self):
+        self.assertEqual(self.run_project(make_project(PLAY_UNTIL_DONE)), 1)
+
+    def test_second_project(self):
+        screen = PygameScreen(audio_sink=skip.audio.NullSink(),
+                              timestep=1.0 / 40)
+        for i in range(2):
+            done = self.run_project(make_project(PLAY_UNTIL_DONE),
+                                    screen=screen)
+            self.assertEqual(done, 1)
+
+    def test_restore_earlier_snapshot(self):
+        project = make_project("""when I receive [go v]
+play sound [beep v] until done
+change [done v] by (1)""")
+        screen = PygameScreen(audio_sink=skip.audio.NullSink(),
+                              timestep=1.0 / 40)
+        screen.set_project(project)
+        snapshot = screen.interpreter.snapshot()
+        for i in range(80):
+            screen.step([])
+        screen.interpreter.restore(snapshot)
+        screen.interpreter.trigger_hats("whenIReceive", "go")
+        for i in range(30):
+            screen.step([])
+        self.assertEqual(project.sprites[0].variables["done"].value, 1)
+
+    def test_stop_all_sounds(self):
+        project = make_project(PLAY_UNTIL_DONE, """when green flag clicked
+wait (0.1) secs
+stop all sounds""")
+        self.assertEqual(self.run_project(project, frames=10), 1)
+
+    def test_same_sound_restarted(self):
+        project = make_project(PLAY_UNTIL_DONE, """when green flag clicked
+wait (0.1) secs
+play sound [beep v]""")
+        self.assertEqual(self.run_project(project, frames=10), 1)
+
+    def test_green_flag_restart(self):
+        # Each time the flag is clicked, the second script restarts the
+        # sound the first is waiting for, so the first finishes both times.
+        # The second is cut short by the restart the first time.
+        project = make_project(PLAY_UNTIL_DONE, """when green flag clicked
+play sound [beep v] until done
+change [done v] by (10)""")
+        self.assertEqual(self.run_project(project, restart_at=5), 12)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import signal
+import unittest
+
+import kurt
+import skip
+
+
+
+def make_project(scripts, others=()):
+    """A sprite "A" with ``scripts``, and a sprite "B" with ``others``."""
+    project = kurt.Project()
+    project.lists["log"] = kurt.List()
+    project.variables["n"] = kurt.Variable(0)
+    for (name, texts) in (("A", scripts), ("B", others)):
+        sprite = kurt.Sprite(project, name)
+        sprite.costume = kurt.Costume("square",
+                                      kurt.Image.new((60, 60), (0, 0, 0)))
+        for text in texts:
+            sprite.parse(text)
+        project.sprites.append(sprite)
+        project.actors.append(sprite)
+    project.convert("scratch20") # for "all at once"
+    return project
+
+
+class Timeout(Exception):
+    pass
+
+def alarm(signum, frame):
+    raise Timeout
+
+
+class EngineParityTests(unittest.TestCase):
+    """The generator and vm engines run scripts the same way, frame by
+    frame.
+
+    """
+
+    timestep = 1.0 / 40
+
+    def trace(self, engine, scripts, others, frames):
+        project = make_project(scripts, others)
+        screen = skip.Screen()
+        screen.engine = engine
+        screen.set_project(project)
+        interpreter = screen.interpreter
+        interpreter.set_timestep(self.timestep)
+        interpreter.start()
+        frames_seen = []
+        old = signal.signal(signal.SIGALRM, alarm)
+        signal.alarm(5)
+        try:
+            for i in range(frames):
+                for event in interpreter.tick([]):
+                    pass
+                frames_seen.append((
+                    project.variables["n"].value,
+                    list(project.lists["log"].items),
+                    [tuple(s.position) for s in project.sprites],
+                    len(interpreter.threads)))
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, old)
+        return frames_seen
+
+    def assertSame(self, scripts, others=(), frames=30):
+        generator = self.trace("generator", scripts, others, frames)
+        vm = self.trace("vm", scripts, others, frames)
+        self.assertEqual(vm, generator)
+        return generator
+
+    def test_wait(self):
+        trace = self.assertSame(["""when green flag clicked
+wait (0.1) secs
+change [n v] by (1)
+repeat (3)
+    wait (0.05) secs
+    add (n) to [log v]
+end
+wait (0) secs
+change [n v] by (1)"""])
+        self.assertEqual(trace[-1][0], 2)
+
+    def test_glide(self):
+        trace = self.assertSame(["""when green flag clicked
+glide (0.2) secs to x: (100) y: (50)
+glide (0) secs to x: (-20) y: (10)
+add (x position) to [log v]"""])
+        self.assertEqual(trace[-1][2][0], (-20, 10))
+
+    def test_loops(self):
+        trace = self.assertSame(["""when green flag clicked
+repeat (3)
+    repeat (2)
+        change x by (1)
+    end
+end
+repeat until ((n) > (4))
+    change [n v] by (1)
+end
+forever
+    if ((x position) < (10))
+        change x by (1)
+    else
+        add [done] to [log v]
+    end
+end"""])
+        self.assertEqual(trace[-1][0], 5)
+
+    def test_all_at_once(self):
+        trace = self.assertSame(["""when green flag clicked
+all at once
+    repeat (10)
+        change x by (1)
+        add (x position) to [log v]
+    end
+    wait (0.1) secs
+    glide (0.1) secs to x: (50) y: (0)
+end
+change [n v] by (1)"""])
+        self.assertEqual(trace[-1][0], 1)
+
+    def test_broadcast_and_wait(self):
+        trace = self.assertSame(["""when green flag clicked
+add [before] to [log v]
+broadcast [go v] and wait
+add [after] to [log v]"""], ["""when I receive [go v]
+repeat (3)
+    change y by (1)
+    add (y position) to [log v]
+end""", """when I receive [go v]
+wait (0.1) secs
+add [waited] to [log v]"""])
+        self.assertEqual(trace[-1][1][-1], "after")
+
+    def test_stop(self):
+        trace = self.assertSame(["""when green flag clicked
+forever
+    change [n v] by (1)
+end""", """when green flag clicked
+wait (0.1) secs
+stop [other scripts in sprite v]
+add [stopped others] to [log v]""", """when green flag clicked
+add [once] to [log v]
+stop [this script v]
+add [never] to [log v]"""], ["""when green flag clicked
+forever
+    change x by (1)
+    if ((x position) > (12))
+        stop [all v]
+    end
+end"""])
+        self.assertEqual(trace[-1][1], ["once", "stopped others"])
+        self.assertEqual(trace[-1][3], 0)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
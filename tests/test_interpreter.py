@@ -0,0 +1,111 @@
+import unittest
+
+import kurt
+import skip
+from skip.bench import run_frames
+
+
+
+def make_project():
+    project = kurt.Project()
+    sprite = kurt.Sprite(project, "Sprite1")
+    sprite.costume = kurt.Costume("square",
+                                  kurt.Image.new((60, 60), (0, 0, 0)))
+    sprite.variables["counter"] = kurt.Variable(0)
+    sprite.lists["trail"] = kurt.List()
+    project.sprites.append(sprite)
+    project.convert("scratch14")
+    return project
+
+
+class PushTests(unittest.TestCase):
+    engine = "generator"
+
+    def setUp(self):
+        self.project = make_project()
+        self.sprite = self.project.sprites[0]
+        self.screen = skip.Screen()
+        self.screen.engine = self.engine
+        self.screen.set_project(self.project)
+        self.interpreter = self.screen.interpreter
+        self.results = []
+
+    def callback(self, value, error):
+        self.results.append((value, error))
+
+    def parse(self, text):
+        return kurt.text.parse(text, self.sprite)
+
+    def parse_broken(self, text):
+        """Parse blocks using the list, then delete it."""
+        script = self.parse(text)
+        del self.sprite.lists["trail"]
+        return script
+
+    def test_reporter(self):
+        block = self.parse("(join [a] (join [b] [c]))")[0]
+        self.interpreter.push_reporter(self.sprite, block, self.callback)
+        run_frames(self.interpreter, 2)
+        self.assertEqual(self.results, [("abc", None)])
+
+    def test_reporter_error(self):
+        block = self.parse_broken("(item (1) of [trail v])")[0]
+        self.interpreter.push_reporter(self.sprite, block, self.callback)
+        run_frames(self.interpreter, 2)
+        [(value, error)] = self.results
+        self.assertIsNone(value)
+        self.assertIsInstance(error, KeyError)
+        self.assertEqual(len(self.interpreter.threads), 0)
+
+    def test_reporter_not_supported(self):
+        block = self.parse("(join [a] (username))")[0]
+        self.assertRaises(kurt.BlockNotSupported,
+                          self.interpreter.push_reporter, self.sprite, block,
+                          self.callback)
+        self.assertEqual(len(self.interpreter.new_threads), 0)
+
+    def test_script_not_supported(self):
+        script = self.parse("repeat (2)\n    turn video on\nend")
+        self.assertRaises(kurt.BlockNotSupported, self.interpreter.check,
+                          script)
+
+    def test_script_errback(self):
+        script = self.parse_broken("change [counter v] by (1)\n"
+                                   "add [x] to [trail v]\n"
+                                   "change [counter v] by (1)")
+        errors = []
+        done = []
+        self.interpreter.push_script(self.sprite, script,
+                callback=done.append,
+                errback=lambda thread, error: errors.append(error))
+        run_frames(self.interpreter, 2)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], KeyError)
+        self.assertEqual(done, [])
+        self.assertEqual(self.sprite.variables["counter"].value, 1)
+        self.assertEqual(len(self.interpreter.threads), 0)
+
+    def test_script_error_without_errback(self):
+        script = self.parse_broken("add [x] to [trail v]")
+        self.interpreter.push_script(self.sprite, script)
+        self.assertRaises(KeyError, run_frames, self.interpreter, 1)
+
+
+class VMPushTests(PushTests):
+    engine = "vm"
+
+
+class ParseEditTests(unittest.TestCase):
+    def test_valid(self):
+        self.assertEqual(skip.parse_edit("edit 1", 3), 0)
+        self.assertEqual(skip.parse_edit("edit 3", 3), 2)
+
+    def test_invalid(self):
+        for command in ("edit", "edit x", "edit 0", "edit 4", "edit -1",
+                        "edit 1 2"):
+            self.assertIsNone(skip.parse_edit(command, 3), command)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
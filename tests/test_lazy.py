@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import kurt
+import kurt.scratch14
+from kurt.scratch14.fixed_objects import Form
+import skip.lazy
+from skip.bench import make_media_project, save_like_scratch
+
+
+
+class LazyLoadTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = save_like_scratch(make_media_project(3, 2),
+                                      os.path.join(self.folder, "media.sb"))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def costumes(self, project):
+        return [c for s in project.sprites for c in s.costumes]
+
+    def test_not_decoded(self):
+        project = skip.lazy.load(self.path)
+        for costume in self.costumes(project):
+            self.assertFalse(costume.image.is_decoded)
+            self.assertEqual(costume.image.size, (120, 120))
+
+    def test_same_pixels(self):
+        lazy = self.costumes(skip.lazy.load(self.path))
+        eager = self.costumes(kurt.Project.load(self.path))
+        self.assertEqual([c.image.pil_image.tobytes() for c in lazy],
+                         [c.image.pil_image.tobytes() for c in eager])
+
+    def test_kurt_unchanged(self):
+        # an eager load during a lazy one still builds its Forms
+        built = Form.built.im_func
+        eager = []
+        def load_image(serializer, v14_image):
+            self.assertIs(Form.built.im_func, built)
+            if not eager:
+                eager.append(kurt.Project.load(self.path))
+            return original(serializer, v14_image)
+        original = skip.lazy.LazySerializer.load_image.im_func
+        skip.lazy.LazySerializer.load_image = load_image
+        try:
+            lazy = skip.lazy.load(self.path)
+        finally:
+            skip.lazy.LazySerializer.load_image = original
+        self.assertTrue(eager)
+        for costume in self.costumes(eager[0]):
+            self.assertTrue(costume.image.pil_image)
+        for costume in self.costumes(lazy):
+            self.assertFalse(costume.image.is_decoded)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+
+import kurt
+import skip
+from skip.bench import run_frames
+
+
+
+def make_project():
+    project = kurt.Project()
+    sprite = kurt.Sprite(project, "Sprite1")
+    sprite.costume = kurt.Costume("square",
+                                  kurt.Image.new((60, 60), (0, 0, 0)))
+    sprite.variables["n"] = kurt.Variable(2)
+    sprite.lists["log"] = kurt.List()
+    project.sprites.append(sprite)
+    project.convert("scratch14")
+    return project
+
+
+class OptimizeTests(unittest.TestCase):
+    engine = "generator"
+
+    def setUp(self):
+        self.project = make_project()
+        self.sprite = self.project.sprites[0]
+        self.screen = skip.Screen()
+        self.screen.engine = self.engine
+        self.screen.set_project(self.project)
+        self.interpreter = self.screen.interpreter
+
+    def parse(self, text):
+        return kurt.text.parse(text, self.sprite)
+
+    def prepare(self, text):
+        return self.interpreter.prepare(self.parse(text))
+
+    def assertPrepared(self, text, expected):
+        self.assertEqual(self.prepare(text).blocks,
+                         self.parse(expected).blocks)
+
+    def run_script(self, text):
+        errors = []
+        self.interpreter.push_script(self.sprite, self.parse(text),
+                errback=lambda thread, error: errors.append(error))
+        run_frames(self.interpreter, 2)
+        return errors
+
+    def test_fold(self):
+        script = self.prepare("add ((1) + ((2) * (3))) to [log v]")
+        self.assertEqual(script.blocks[0].args, [7, "log"])
+        script = self.prepare("add (join [a] (join [b] [c])) to [log v]")
+        self.assertEqual(script.blocks[0].args, ["abc", "log"])
+        self.assertEqual(self.interpreter.fold_stats.folded, 4)
+
+    def test_not_pure(self):
+        for text in ("add (pick random (1) to (10)) to [log v]",
+                     "add ((n) + (1)) to [log v]",
+                     "add (join (x position) [!]) to [log v]"):
+            script = self.parse(text)
+            self.assertIs(self.interpreter.prepare(script), script)
+        self.assertEqual(self.interpreter.fold_stats.folded, 0)
+
+    def test_fold_inside_reporter(self):
+        script = self.prepare("add ((n) + ((2) * (3))) to [log v]")
+        [reporter, name] = script.blocks[0].args
+        self.assertEqual(reporter.args[1], 6)
+        self.assertIsInstance(reporter.args[0], kurt.Block)
+
+    def test_divide_by_zero(self):
+        script = self.parse("add ((1) / (0)) to [log v]")
+        self.assertEqual(self.interpreter.prepare(script).blocks,
+                         script.blocks)
+        self.assertEqual(self.interpreter.fold_stats.folded, 0)
+        [error] = self.run_script("add ((1) / (0)) to [log v]")
+        self.assertIsInstance(error, ZeroDivisionError)
+
+    def test_prune_if(self):
+        self.assertPrepared("""if ((1) < (2))
+    add [yes] to [log v]
+end
+add [after] to [log v]""", """add [yes] to [log v]
+add [after] to [log v]""")
+        self.assertPrepared("""if ((2) < (1))
+    add [yes] to [log v]
+end
+add [after] to [log v]""", "add [after] to [log v]")
+        self.assertEqual(self.interpreter.fold_stats.pruned, 2)
+
+    def test_prune_if_else(self):
+        self.assertPrepared("""if ((1) = (1))
+    add [yes] to [log v]
+else
+    add [no] to [log v]
+end""", "add [yes] to [log v]")
+        self.assertPrepared("""if ([a] = [b])
+    add [yes] to [log v]
+else
+    add [no] to [log v]
+end""", "add [no] to [log v]")
+        self.assertEqual(self.interpreter.fold_stats.pruned, 2)
+
+    def test_keep_if(self):
+        text = """if ((n) < (3))
+    add [yes] to [log v]
+else
+    add [no] to [log v]
+end"""
+        script = self.parse(text)
+        self.assertIs(self.interpreter.prepare(script), script)
+        self.assertEqual(self.interpreter.fold_stats.pruned, 0)
+
+    def test_same_result(self):
+        errors = self.run_script("""if (((2) * (3)) > (5))
+    add (join [a] ((1) + (1))) to [log v]
+else
+    add [no] to [log v]
+end
+add ((n) * ((2) + (2))) to [log v]""")
+        self.assertEqual(errors, [])
+        self.assertEqual(self.sprite.lists["log"].items, ["a2", 8])
+
+
+class VMOptimizeTests(OptimizeTests):
+    engine = "vm"
+
+
+
+if __name__ == "__main__":
+    unittest.main()
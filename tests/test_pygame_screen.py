@@ -0,0 +1,78 @@
+import os
+import unittest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import kurt
+import skip
+import skip.audio
+from skip.pygame_screen import PygameScreen
+
+
+
+def make_project():
+    project = kurt.Project()
+    project.stage.costume = kurt.Costume("backdrop",
+            kurt.Image.new(kurt.Stage.SIZE, (255, 255, 255)))
+    sprite = kurt.Sprite(project, "Sprite1")
+    sprite.costume = kurt.Costume("square",
+                                  kurt.Image.new((60, 60), (0, 0, 0)))
+    sprite.variables["counter"] = kurt.Variable(0)
+    sprite.parse("""when green flag clicked
+forever
+    change [counter v] by (1)
+    say (counter)
+    change [color v] effect by (25)
+end""")
+    project.sprites.append(sprite)
+    project.actors.append(sprite)
+    project.actors.append(kurt.Watcher(sprite,
+            kurt.Block("readVariable", "counter")))
+    project.convert("scratch14")
+    return project
+
+
+class RendererTests(unittest.TestCase):
+    def test_stop(self):
+        screen = PygameScreen(threaded=True, audio_sink=skip.audio.NullSink(),
+                              fps=0)
+        screen.set_project(make_project())
+        screen.interpreter.start()
+        for i in range(20):
+            screen.tick()
+        renderer = screen.renderer
+        renderer.stop()
+        self.assertFalse(renderer.is_alive())
+        self.assertTrue(renderer.rendered > 0)
+        self.assertEqual(renderer.rendered + renderer.dropped, 20)
+
+    def test_overlays(self):
+        screen = PygameScreen(audio_sink=skip.audio.NullSink())
+        project = make_project()
+        screen.set_project(project)
+        screen.interpreter.start()
+        screen.tick()
+        (bubbles, watchers) = screen.take_overlays()
+        sprite = project.sprites[0]
+        self.assertEqual(bubbles, ((sprite, ("say", u"1")),))
+        self.assertEqual([key for (watcher, key) in watchers],
+                         [("normal", u"1")])
+
+
+class FixedTimestepTests(unittest.TestCase):
+    def test_first_frame(self):
+        for timestep in (1.0 / 60, 1.0 / 40, 1.0 / 30, 0.05, 0.1, 0.3):
+            screen = PygameScreen(audio_sink=skip.audio.NullSink(),
+                                  timestep=timestep)
+            screen.set_project(make_project())
+            screen.interpreter.start()
+            screen.tick()
+            sprite = screen.project.sprites[0]
+            self.assertEqual(sprite.variables["counter"].value, 1, timestep)
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import signal
+import unittest
+
+import kurt
+import skip
+from skip.bench import run_frames
+
+
+
+def make_project(script):
+    project = kurt.Project()
+    sprite = kurt.Sprite(project, "Sprite1")
+    sprite.costume = kurt.Costume("square",
+                                  kurt.Image.new((60, 60), (0, 0, 0)))
+    sprite.variables["n"] = kurt.Variable(0)
+    sprite.parse(script)
+    project.sprites.append(sprite)
+    project.convert("scratch20") # for "all at once"
+    return project
+
+
+class Timeout(Exception):
+    pass
+
+def alarm(signum, frame):
+    raise Timeout
+
+
+class ConditionTests(unittest.TestCase):
+    engine = "generator"
+
+    def run_project(self, script, frames=3, seconds=5):
+        project = make_project(script)
+        screen = skip.Screen()
+        screen.engine = self.engine
+        screen.set_project(project)
+        screen.interpreter.start()
+        old = signal.signal(signal.SIGALRM, alarm)
+        signal.alarm(seconds)
+        try:
+            run_frames(screen.interpreter, frames)
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, old)
+        return project.sprites[0].variables["n"].value
+
+    def test_atomic_timer_loop(self):
+        n = self.run_project("""when green flag clicked
+reset timer
+all at once
+    repeat until ((timer) > (0.2))
+        change [n v] by (1)
+    end
+end
+set [n v] to [-1]""")
+        self.assertEqual(n, -1)
+
+
+class VMConditionTests(ConditionTests):
+    engine = "vm"
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import json
+import os
+import shutil
+import signal
+import tempfile
+import time
+import unittest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import kurt
+import skip
+import skip.audio
+import skip.replay
+import skip.server
+from skip.pygame_screen import PygameScreen
+
+
+
+SCRIPT = """when green flag clicked
+forever
+    set [t v] to (timer)
+    change [frames v] by (1)
+    if ((timer) > ((ticks) / (10)))
+        change [ticks v] by (1)
+    end
+end"""
+
+
+def make_project():
+    project = kurt.Project()
+    sprite = kurt.Sprite(project, "Sprite1")
+    sprite.costume = kurt.Costume("square",
+                                  kurt.Image.new((60, 60), (0, 0, 0)))
+    for name in ("t", "frames", "ticks"):
+        sprite.variables[name] = kurt.Variable(0)
+    sprite.parse(SCRIPT)
+    project.sprites.append(sprite)
+    project.convert("scratch14")
+    return project
+
+def values(project):
+    sprite = project.sprites[0]
+    return dict(("Sprite1: " + name, variable.value)
+                for (name, variable) in sprite.variables.items())
+
+
+class ServerReplayTests(unittest.TestCase):
+    """The server replays a recording just like :class:`ReplayScreen`."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "session.rec")
+
+        # Frames take longer than the server's timestep.
+        screen = PygameScreen(audio_sink=skip.audio.NullSink())
+        screen.recorder = skip.replay.Recorder(self.path, 1234)
+        screen.set_project(make_project())
+        screen.interpreter.start()
+        for i in range(12):
+            screen.step([])
+            time.sleep(0.04)
+        screen.recorder.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def replay(self):
+        recording = skip.replay.Recording.load(self.path)
+        screen = skip.replay.ReplayScreen(recording)
+        project = make_project()
+        screen.set_project(project)
+        screen.run()
+        return values(project)
+
+    def test_run(self):
+        server = skip.server.PreforkServer(make_project())
+        server.prepare()
+        result = server.run(skip.server.Job(recording=self.path))
+        self.assertEqual(result['variables'], self.replay())
+        self.assertEqual(result['frames'], 12)
+
+    def test_serve(self):
+        server = skip.server.PreforkServer(make_project(), workers=2)
+        jobs = [skip.server.Job(recording=self.path)] * 2
+        results = [json.loads(line) for line in server.serve(jobs)]
+        expected = self.replay()
+        self.assertEqual([r['variables'] for r in results], [expected] * 2)
+
+
+class ServerErrorTests(unittest.TestCase):
+    def test_result_not_json(self):
+        project = make_project()
+        sprite = project.sprites[0]
+        sprite.variables["name"] = kurt.Variable("\xff") # not UTF-8
+        server = skip.server.PreforkServer(project, frames=2)
+        [line] = list(server.serve([skip.server.Job(seed=1)]))
+        result = json.loads(line)
+        self.assertEqual(result['seed'], 1)
+        self.assertIn("UnicodeDecodeError", result['error'])
+
+    def test_script_error(self):
+        project = make_project()
+        sprite = project.sprites[0]
+        sprite.lists["l"] = kurt.List()
+        sprite.parse("""when green flag clicked
+add [x] to [l v]""")
+        del sprite.lists["l"]
+        server = skip.server.PreforkServer(project, frames=2)
+        [line] = list(server.serve([skip.server.Job(seed=1)]))
+        self.assertIn("KeyError", json.loads(line)['error'])
+
+
+
+class Timeout(Exception):
+    pass
+
+def alarm(signum, frame):
+    raise Timeout
+
+
+class JobReaderTests(unittest.TestCase):
+    def test_result_before_more_input(self):
+        (read_fd, write_fd) = os.pipe()
+        server = skip.server.PreforkServer(make_project(), frames=2,
+                                           workers=2)
+        results = server.serve(skip.server.JobReader(read_fd))
+        old = signal.signal(signal.SIGALRM, alarm)
+        signal.alarm(10)
+        try:
+            os.write(write_fd, "1\n")
+            first = json.loads(next(results)) # while stdin's still open
+            os.write(write_fd, "2\n3")
+            os.close(write_fd)
+            rest = [json.loads(line) for line in results]
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, old)
+            os.close(read_fd)
+        self.assertEqual(first['seed'], 1)
+        self.assertEqual(sorted(r['seed'] for r in rest), [2, 3])
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+
+import kurt
+import skip
+from skip.bench import run_frames
+
+
+
+SCRIPT = """when green flag clicked
+forever
+    add [%s] to [log v]
+    repeat (%i)
+        change x by (1)
+        go to front
+    end
+end"""
+
+
+TIMED_SCRIPT = """when green flag clicked
+forever
+    wait (0.1) secs
+    add (timer) to [log v]
+end"""
+
+
+def make_project(timed=False):
+    project = kurt.Project()
+    project.lists["log"] = kurt.List()
+    for name in ("A", "B", "C"):
+        sprite = kurt.Sprite(project, name)
+        sprite.costume = kurt.Costume("square",
+                                      kurt.Image.new((60, 60), (0, 0, 0)))
+        for i in range(1, 5):
+            sprite.parse(SCRIPT % (name + str(i), i))
+        if timed:
+            sprite.parse(TIMED_SCRIPT)
+        project.sprites.append(sprite)
+        project.actors.append(sprite)
+    project.convert("scratch14")
+    return project
+
+
+class SnapshotTests(unittest.TestCase):
+    """Restoring a snapshot carries on exactly as if it hadn't been taken."""
+
+    engine = "vm"
+    timestep = None
+
+    def start(self):
+        screen = skip.Screen()
+        screen.engine = self.engine
+        project = make_project(timed=bool(self.timestep))
+        screen.set_project(project)
+        interpreter = screen.interpreter
+        if self.timestep:
+            interpreter.set_timestep(self.timestep)
+        interpreter.start()
+        return interpreter
+
+    def state(self, interpreter):
+        project = interpreter.project
+        return (list(project.lists["log"].items),
+                [sprite.name for sprite in interpreter.layers],
+                [sprite.position for sprite in project.sprites])
+
+    def run_twice(self, before, after, between=None, at_snapshot=None):
+        expected = self.start()
+        run_frames(expected, before)
+        if at_snapshot:
+            at_snapshot(expected)
+        run_frames(expected, after)
+
+        interpreter = self.start()
+        run_frames(interpreter, before)
+        if at_snapshot:
+            at_snapshot(interpreter)
+        data = interpreter.snapshot().dumps()
+        if between:
+            between(interpreter)
+        interpreter.restore(skip.Snapshot.loads(data))
+        run_frames(interpreter, after)
+        self.assertEqual(self.state(interpreter), self.state(expected))
+
+    def test_restore(self):
+        self.run_twice(7, 10)
+
+    def test_restore_after_running_on(self):
+        self.run_twice(7, 10, lambda interpreter: run_frames(interpreter, 5))
+
+    def test_restore_with_new_threads(self):
+        def restart(interpreter):
+            sprite = interpreter.project.sprites[1]
+            interpreter.push_script(sprite, sprite.scripts[2])
+            sprite = interpreter.project.sprites[0]
+            interpreter.push_script(sprite, sprite.scripts[0])
+        self.run_twice(7, 10, at_snapshot=restart)
+
+
+class TimestepSnapshotTests(SnapshotTests):
+    timestep = 1.0 / 40
+
+
+class GeneratorTimestepSnapshotTests(SnapshotTests):
+    """Generator threads restart from the top of their scripts when restored,
+    so only check the clock.
+
+    """
+
+    engine = "generator"
+    timestep = 1.0 / 40
+
+    def state(self, interpreter):
+        return (interpreter.step_clock, interpreter.now(),
+                interpreter.timer_start)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+from cStringIO import StringIO
+import os
+import signal
+import unittest
+import wave
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import kurt
+import skip
+import skip.audio
+from skip.pygame_screen import PygameScreen
+
+
+
+def make_wave(seconds):
+    f = StringIO()
+    w = wave.open(f, "wb")
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(skip.audio.RATE)
+    w.writeframes("\0\1" * int(seconds * skip.audio.RATE))
+    w.close()
+    return f.getvalue()
+
+def make_project(script):
+    project = kurt.Project()
+    sprite = kurt.Sprite(project, "Sprite1")
+    sprite.costume = kurt.Costume("square",
+                                  kurt.Image.new((60, 60), (0, 0, 0)))
+    sprite.sounds = [kurt.Sound("beep", kurt.Waveform(make_wave(0.1)))]
+    sprite.variables["n"] = kurt.Variable(0)
+    sprite.parse(script)
+    project.sprites.append(sprite)
+    project.convert("scratch20") # for "all at once"
+    return project
+
+
+class Timeout(Exception):
+    pass
+
+def alarm(signum, frame):
+    raise Timeout
+
+
+class AtomicTimingTests(unittest.TestCase):
+    """Timing blocks finish inside "all at once" when the clock only moves
+    between ticks.
+
+    """
+
+    engine = "generator"
+
+    def run_project(self, script, frames=20):
+        screen = PygameScreen(audio_sink=skip.audio.NullSink(),
+                              timestep=1.0 / 40)
+        screen.engine = self.engine
+        project = make_project(script)
+        screen.set_project(project)
+        screen.interpreter.start()
+        old = signal.signal(signal.SIGALRM, alarm)
+        signal.alarm(5)
+        try:
+            for i in range(frames):
+                screen.step([])
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, old)
+        return project.sprites[0]
+
+    def test_wait(self):
+        sprite = self.run_project("""when green flag clicked
+all at once
+    wait (0.1) secs
+    change [n v] by (1)
+end""")
+        self.assertEqual(sprite.variables["n"].value, 1)
+
+    def test_glide(self):
+        sprite = self.run_project("""when green flag clicked
+all at once
+    glide (0.1) secs to x: (100) y: (50)
+    change [n v] by (1)
+end""")
+        self.assertEqual(sprite.position, (100, 50))
+        self.assertEqual(sprite.variables["n"].value, 1)
+
+    def test_say_for_secs(self):
+        sprite = self.run_project("""when green flag clicked
+all at once
+    say [Hello!] for (0.1) secs
+    change [n v] by (1)
+end""")
+        self.assertEqual(sprite.variables["n"].value, 1)
+
+    def test_play_sound_until_done(self):
+        sprite = self.run_project("""when green flag clicked
+all at once
+    play sound [beep v] until done
+    change [n v] by (1)
+end""")
+        self.assertEqual(sprite.variables["n"].value, 1)
+
+
+class VMAtomicTimingTests(AtomicTimingTests):
+    engine = "vm"
+
+
+
+if __name__ == "__main__":
+    unittest.main()